@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from app.models.tts import OptimizeRequest, TrainRequest, TrainingJobOut
+from app.services.training_service import VOICE_MODEL_ROOT, optimize_voice_model, run_training_job, training_jobs
+from app.utils.resumable_trainer import find_resume_run
+
+
+train_router = APIRouter()
+
+
+@train_router.post("/start", status_code=202)
+async def start_training(request: TrainRequest):
+    return submit_training(request, resume=False)
+
+
+@train_router.post("/resume", status_code=202)
+async def resume_training(request: TrainRequest):
+    """Continues the latest run of the model from its last checkpoint, e.g. after the job was stopped or preempted."""
+    model_dir = os.path.join(str(VOICE_MODEL_ROOT), request.name.strip())
+    if not request.name.strip() or find_resume_run(os.path.join(model_dir, "run", "training")) is None:
+        raise HTTPException(status_code=404, detail=f"No checkpoint to resume for model '{request.name.strip()}'.")
+    return submit_training(request, resume=True)
+
+
+def submit_training(request: TrainRequest, resume: bool):
+    model_name = request.name.strip()
+    if not model_name:
+        raise HTTPException(status_code=400, detail="Model name is required.")
+
+    model_dir = os.path.join(str(VOICE_MODEL_ROOT), model_name)
+    dataset_dir = os.path.join(model_dir, "dataset")
+    if not all(os.path.exists(os.path.join(dataset_dir, name)) for name in ("metadata_train.csv", "metadata_eval.csv")):
+        raise HTTPException(status_code=400, detail=f"Model '{model_name}' has no processed dataset yet.")
+
+    params = {
+        "model_dir": model_dir,
+        "language": request.language.strip() or "en",
+        "num_epochs": request.epochs,
+        "batch_size": request.batch_size,
+        "grad_acumm": request.grad_acumm,
+        "max_audio_length": request.max_audio_length,
+        "version": request.version,
+        "custom_model": request.custom_model.strip(),
+        "resume": resume,
+    }
+    job = training_jobs.submit("train", run_training_job, params)
+
+    return {
+        "success": True,
+        "message": "Training resume queued." if resume else "Training queued.",
+        "job_id": job.id,
+        "status": job.status,
+    }
+
+
+@train_router.post("/optimize")
+async def optimize_model(request: OptimizeRequest):
+    """Strips the optimizer state and DVAE weights from the trained model (the demo's "Optimize the model" step)."""
+    model_name = request.name.strip()
+    if not model_name:
+        raise HTTPException(status_code=400, detail="Model name is required.")
+    try:
+        result = await run_in_threadpool(optimize_voice_model, os.path.join(str(VOICE_MODEL_ROOT), model_name), request.dtype, request.format)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"success": True, "message": "Model optimized.", **result}
+
+
+@train_router.get("/jobs", response_model=list[TrainingJobOut])
+async def list_training_jobs():
+    return [job.to_dict() for job in training_jobs.list()]
+
+
+@train_router.get("/jobs/{job_id}", response_model=TrainingJobOut)
+async def get_training_job(job_id: str):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@train_router.get("/jobs/{job_id}/logs")
+async def get_training_logs(job_id: str, since: int = 0):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    entries, next_seq, dropped = job.logs.read(since)
+    return {"entries": entries, "next": next_seq, "dropped": dropped, "status": job.status}
+
+
+@train_router.delete("/jobs/{job_id}", response_model=TrainingJobOut)
+async def cancel_training_job(job_id: str):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
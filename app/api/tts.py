@@ -3,13 +3,22 @@
 from fastapi import APIRouter, HTTPException
 from pathlib import Path
 from app.models.tts import (
-    ModelRequest, DatasetProcessRequest
+    ModelRequest, DatasetProcessRequest, JobOut, SynthesizeRequest
 )
+from app.core.config import DATASET_JOB_DEVICE, DATASET_JOB_RAM_MB, DATASET_JOB_THREADS, DATASET_JOB_WORKERS
+from app.core.jobs import JobManager
+from app.core.resources import resource_scheduler
 from app.utils.formatter import list_audios, format_audio_list
-from faster_whisper import WhisperModel
+from app.services.xtts_service import (
+    ModelNotFoundError, batch_scheduler, xtts_manager, synthesize_async, wav_to_bytes
+)
+from app.utils.asr_pool import get_whisper_model, whisper_pool, ASR_NUM_WORKERS, ASR_BATCH_SIZE
+from app.utils.tokenizer import number_cache_stats
 import os, traceback, torch
 from fastapi import UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 import shutil
 
 
@@ -43,93 +52,156 @@ async def create_new_model_dir(request: ModelRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@tts_router.get("/asr/stats")
+async def asr_stats():
+    return whisper_pool.stats()
 
- # Full absolute path where user audio is uploaded
-
-@tts_router.post("/process-dataset")
-async def process_dataset(
-    name: str = Form(...),
-    audio_file: UploadFile = File(...)
-):    
-    clear_gpu_cache()
-
-    try:
-        model_name = name.strip()
-        if not model_name:
-            raise HTTPException(status_code=400, detail="Model name is required.")
-
-
-        audio_folder = data.audio_folder.strip()
-        # Check audio folder
-        if not os.path.exists(audio_folder) or not os.path.isdir(audio_folder):
-            raise HTTPException(status_code=400, detail="Audio folder is invalid or doesn't exist.")
-
-        # User-defined model path inside voice_models
-        base_dir = "voice_models"
-        model_dir = os.path.join(base_dir, model_name)
-        dataset_dir = os.path.join(model_dir, "dataset")
-        run_dir = os.path.join(model_dir, "run")
-        train_dir = os.path.join(model_dir, "train")
-
-        os.makedirs(dataset_dir, exist_ok=True)
-        os.makedirs(run_dir, exist_ok=True)
-        os.makedirs(train_dir, exist_ok=True)
 
+@tts_router.get("/resources")
+async def resource_stats():
+    return resource_scheduler.stats()
 
-        filename = audio_file.filename
-        audio_path = os.path.join(dataset_dir, filename)
 
-        with open(audio_path, "wb") as f:
-            shutil.copyfileobj(audio_file.file, f)
+dataset_jobs = JobManager(max_workers=DATASET_JOB_WORKERS)
 
-        # Validate it's an audio file (optional)
-        audio_files = [audio_path]
-        if not audio_files:
-            raise HTTPException(status_code=400, detail="No valid audio files received.")
 
-        # Collect audio files
-        audio_files = list(list_audios(audio_folder))
-        if not audio_files:
-            raise HTTPException(status_code=400, detail="No audio files found in the provided directory.")
+def run_dataset_job(job, model_dir, dataset_dir, audio_files, language="en"):
+    clear_gpu_cache()
 
+    # Waits here while training or other dataset jobs hold the cores / GPU it needs
+    with resource_scheduler.acquire(
+        "process-dataset", threads=DATASET_JOB_THREADS, ram_mb=DATASET_JOB_RAM_MB, device=DATASET_JOB_DEVICE, job=job
+    ) as allocation:
         try:
-            # Loading Whisper
-            device = "cuda" if torch.cuda.is_available() else "cpu" 
-            compute_type = "float16" if device == "cuda" else "float32"
-            
-            whisper_model = WhisperModel("large-v3", device=device, compute_type=compute_type)
-           
-             # Format dataset
+            # Shared Whisper model, only loaded on the first request
+            job.message = "Loading Whisper model"
+            whisper_model = get_whisper_model("large-v3", device=allocation.device or "cpu")
+
+            job.message = "Formatting dataset"
+            # Format dataset
             train_csv, eval_csv, duration = format_audio_list(
                 audio_files=audio_files,
                 asr_model=whisper_model,
-                target_language="en",
+                target_language=language,
                 out_path=dataset_dir,
                 # buffer=0.2,
                 # eval_percentage=0.15,
                 # speaker_name="coqui",
-                gradio_progress=None
+                gradio_progress=None,
+                progress_callback=job.report_progress,
+                # Decode and transcription threads, within the job's share of the cores
+                num_workers=max(1, min(ASR_NUM_WORKERS, allocation.threads // 2)),
+                batch_size=ASR_BATCH_SIZE,
             )
-            
+        finally:
             clear_gpu_cache()
 
-        except:
+    job.message = "✅ Dataset processed and saved successfully."
+    return {
+        "model_dir": model_dir,
+        "dataset_dir": dataset_dir,
+        "train_csv": train_csv,
+        "eval_csv": eval_csv,
+        "duration_minutes": round(duration / 60, 2),
+        "chunks_count": len(os.listdir(os.path.join(dataset_dir, "wavs")))
+    }
 
-            clear_gpu_cache()
-            traceback.print_exc()
-            error = traceback.format_exc()
-            raise HTTPException(status_code=500, detail=f"Data processing failed:\n{error}")
-    
-
-        return {
-            "message": "✅ Dataset processed and saved successfully.",
-            "model_dir": model_dir,
-            "dataset_dir": dataset_dir,
-            "train_csv": train_csv,
-            "eval_csv": eval_csv,
-            "duration_minutes": round(duration / 60, 2),
-            "chunks_count": len(os.listdir(os.path.join(dataset_dir, "wavs")))
-        }
 
+ # Full absolute path where user audio is uploaded
+
+@tts_router.post("/process-dataset", status_code=202)
+async def process_dataset(
+    name: str = Form(...),
+    audio_file: Optional[UploadFile] = File(None),
+    audio_folder: Optional[str] = Form(None),
+    language: str = Form("en")
+):
+    model_name = name.strip()
+    if not model_name:
+        raise HTTPException(status_code=400, detail="Model name is required.")
+
+    # User-defined model path inside voice_models
+    model_dir = os.path.join(str(VOICE_MODEL_ROOT), model_name)
+    dataset_dir = os.path.join(model_dir, "dataset")
+    run_dir = os.path.join(model_dir, "run")
+    train_dir = os.path.join(model_dir, "train")
+
+    try:
+        os.makedirs(dataset_dir, exist_ok=True)
+        os.makedirs(run_dir, exist_ok=True)
+        os.makedirs(train_dir, exist_ok=True)
+
+        if audio_file is not None and audio_file.filename:
+            # Keep uploads outside of dataset/wavs so they are never picked up as segments
+            upload_dir = os.path.join(model_dir, "uploads")
+            os.makedirs(upload_dir, exist_ok=True)
+            audio_path = os.path.join(upload_dir, os.path.basename(audio_file.filename))
+
+            with open(audio_path, "wb") as f:
+                await run_in_threadpool(shutil.copyfileobj, audio_file.file, f)
+
+            audio_files = [audio_path]
+        elif audio_folder and audio_folder.strip():
+            audio_folder = audio_folder.strip()
+            # Check audio folder
+            if not os.path.exists(audio_folder) or not os.path.isdir(audio_folder):
+                raise HTTPException(status_code=400, detail="Audio folder is invalid or doesn't exist.")
+
+            # Collect audio files
+            audio_files = list(list_audios(audio_folder))
+        else:
+            raise HTTPException(status_code=400, detail="An audio file or an audio folder is required.")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process dataset: {str(e)}")
+
+    if not audio_files:
+        raise HTTPException(status_code=400, detail="No valid audio files received.")
+
+    job = dataset_jobs.submit("process-dataset", run_dataset_job, model_dir, dataset_dir, audio_files, language.strip() or "en")
+
+    return {
+        "message": "Dataset processing started.",
+        "job_id": job.id,
+        "status": job.status,
+    }
+
+
+@tts_router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: str):
+    job = dataset_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@tts_router.delete("/jobs/{job_id}", response_model=JobOut)
+async def cancel_job(job_id: str):
+    job = dataset_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@tts_router.post("/synthesize")
+async def synthesize_speech(request: SynthesizeRequest):
+    model_name = request.name.strip()
+    if not model_name or not request.text.strip():
+        raise HTTPException(status_code=400, detail="Model name and text are required.")
+
+    params = request.dict(exclude={"name", "text"})
+    try:
+        wav, cache_status = await synthesize_async(model_name, request.text, **params)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Synthesis failed: {str(e)}")
+
+    return Response(content=wav_to_bytes(wav), media_type="audio/wav", headers={"X-Audio-Cache": cache_status})
+
+
+@tts_router.get("/models/stats")
+async def tts_model_stats():
+    return {**xtts_manager.stats(), "batching": batch_scheduler.stats(), "number_cache": number_cache_stats()}
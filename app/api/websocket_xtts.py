@@ -1,12 +1,204 @@
-from fastapi import WebSocket, APIRouter
+from fastapi import WebSocket, WebSocketDisconnect, APIRouter, status
+from functools import partial
+from jose import JWTError
+from pydantic import ValidationError
 import asyncio
+import json
+import threading
+import traceback
+
+from app.api.auth import decode_jwt_token
+from app.core.config import TTS_STREAM_QUEUE_CHUNKS
+from app.core.token_store import token_blacklist
+from app.models.tts import SynthesizeRequest
+from app.services.training_service import training_jobs
+from app.services.xtts_service import (
+    ModelNotFoundError, OUTPUT_SAMPLE_RATE, inference_executor, stream_synthesize, wav_to_pcm16
+)
 
 router = APIRouter()
 
+# Seconds between two reads of a training job's log buffer
+TRAIN_LOG_POLL_INTERVAL = 0.25
+
+
+def authenticate_websocket(websocket: WebSocket):
+    # The HTTP JWT middleware does not see websockets, check the token here
+    token = websocket.query_params.get("token")
+    if not token:
+        auth_header = websocket.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            token = auth_header.split(" ")[1]
+
+    if not token or token in token_blacklist:
+        return None
+    try:
+        return decode_jwt_token(token)
+    except JWTError:
+        return None
+
+
 @router.websocket("/train-logs")
 async def train_log_socket(websocket: WebSocket):
+    """Follows the log lines and metrics of a training job as they are produced.
+
+    Query parameters: `job_id` (defaults to the most recent training job) and
+    `since`, the first entry to send, to pick up after a reconnect. Entries
+    are sent as JSON ({"type": "log" | "metrics", "seq": ...}), then
+    {"type": "end", "status": ...} once the job is over.
+    """
+    if authenticate_websocket(websocket) is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    job_id = websocket.query_params.get("job_id")
+    jobs = training_jobs.list()
+    job = training_jobs.get(job_id) if job_id else (jobs[-1] if jobs else None)
+    await websocket.accept()
+    if job is None:
+        await websocket.send_json({"type": "error", "detail": "Training job not found"})
+        await websocket.close()
+        return
+
+    try:
+        since = int(websocket.query_params.get("since", 0))
+    except ValueError:
+        since = 0
+    await websocket.send_json({"type": "job", **job.to_dict()})
+    try:
+        while True:
+            # Read the status first so entries written before the job ended are all sent
+            finished = job.status in ("completed", "failed", "cancelled")
+            entries, since, dropped = job.logs.read(since)
+            if dropped:
+                await websocket.send_json({"type": "dropped", "count": dropped})
+            for entry in entries:
+                await websocket.send_json(entry)
+            if finished:
+                await websocket.send_json({"type": "end", **job.to_dict()})
+                await websocket.close()
+                return
+            await asyncio.sleep(TRAIN_LOG_POLL_INTERVAL)
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/synthesize")
+async def synthesize_socket(websocket: WebSocket):
+    """Streams synthesized speech as it is generated.
+
+    The client sends a JSON synthesis request (same fields as POST /api/tts/synthesize)
+    and receives {"type": "start"}, binary frames of mono 16-bit little-endian PCM
+    and {"type": "end"}. Sending {"type": "cancel"} stops the current generation.
+    """
+    if authenticate_websocket(websocket) is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     await websocket.accept()
-    for i in range(100):
-        await websocket.send_text(f"Training step {i}")
-        await asyncio.sleep(1)
-    await websocket.close()
+    receiver = asyncio.create_task(_receive_message(websocket))
+    try:
+        while True:
+            message, error = await receiver
+            receiver = asyncio.create_task(_receive_message(websocket))
+            if error is not None:
+                await websocket.send_json({"type": "error", "detail": error})
+                continue
+            if message.get("type") == "cancel":
+                continue
+            receiver = await _stream_request(websocket, message, receiver)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+async def _receive_message(websocket: WebSocket):
+    """(the next JSON object sent by the client, None) or (None, why the frame is not one).
+
+    Raises WebSocketDisconnect when the client went away.
+    """
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE), frame.get("reason"))
+    if frame.get("text") is None:
+        return None, "Expected a JSON text frame"
+    try:
+        message = json.loads(frame["text"])
+    except ValueError:
+        return None, "Invalid JSON"
+    if not isinstance(message, dict):
+        return None, "Expected a JSON object"
+    return message, None
+
+
+async def _stream_request(websocket: WebSocket, message: dict, receiver: asyncio.Task):
+    try:
+        request = SynthesizeRequest(**message)
+    except ValidationError as e:
+        await websocket.send_json({"type": "error", "detail": e.errors()})
+        return receiver
+
+    loop = asyncio.get_running_loop()
+    # Bounded: the inference thread waits when the client falls behind
+    queue = asyncio.Queue(maxsize=TTS_STREAM_QUEUE_CHUNKS)
+    cancel_event = threading.Event()
+
+    def on_chunk(chunk):
+        asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+
+    params = request.dict(exclude={"name", "text"})
+    producer = loop.run_in_executor(
+        inference_executor,
+        partial(stream_synthesize, request.name.strip(), request.text, on_chunk, cancel_event, **params)
+    )
+
+    await websocket.send_json({"type": "start", "sample_rate": OUTPUT_SAMPLE_RATE, "format": "pcm_s16le", "channels": 1})
+    chunks_sent = 0
+    try:
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, receiver, producer}, return_when=asyncio.FIRST_COMPLETED)
+
+            if getter in done:
+                if not cancel_event.is_set():
+                    await websocket.send_bytes(wav_to_pcm16(getter.result()))
+                    chunks_sent += 1
+                continue
+            getter.cancel()
+
+            if receiver in done:
+                # Raises WebSocketDisconnect when the client went away
+                control, error = receiver.result()
+                if error is not None:
+                    await websocket.send_json({"type": "error", "detail": error})
+                elif control.get("type") == "cancel":
+                    cancel_event.set()
+                receiver = asyncio.create_task(_receive_message(websocket))
+                continue
+
+            # Producer finished, flush what it left in the queue
+            while not queue.empty() and not cancel_event.is_set():
+                await websocket.send_bytes(wav_to_pcm16(queue.get_nowait()))
+                chunks_sent += 1
+            break
+
+        try:
+            producer.result()
+        except ModelNotFoundError as e:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            return receiver
+        except Exception as e:
+            traceback.print_exc()
+            await websocket.send_json({"type": "error", "detail": f"Synthesis failed: {str(e)}"})
+            return receiver
+
+        await websocket.send_json({"type": "end", "chunks": chunks_sent, "cancelled": cancel_event.is_set()})
+        return receiver
+    finally:
+        # Unblock the inference thread if we stopped consuming early
+        cancel_event.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait({producer}, timeout=0.05)
@@ -0,0 +1,419 @@
+"""Micro-benchmarks for the text and data pipelines.
+
+Run from the app/ directory (like xtts_demo.py), e.g.:
+
+    python benchmarks.py normalize --languages en es ru --size 5000
+"""
+import argparse
+import time
+
+
+def _best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _report(label, baseline, optimized):
+    print(f"{label:<28} baseline {baseline * 1000:9.1f} ms   optimized {optimized * 1000:9.1f} ms   x{baseline / optimized:.2f}")
+
+
+def bench_normalize(args):
+    from utils.tokenizer import (
+        _multilingual_cleaners_sequential,
+        _normalizer_corpus,
+        expand_abbreviations_multilingual,
+        expand_symbols_multilingual,
+        get_normalizer,
+        multilingual_cleaners,
+    )
+
+    for lang in args.languages:
+        corpus = _normalizer_corpus(lang, size=args.size)
+        try:
+            multilingual_cleaners(corpus[0], lang)
+            _multilingual_cleaners_sequential(corpus[0], lang)
+        except NotImplementedError:
+            print(f"{lang}: skipped, num2words does not support it in this environment")
+            continue
+
+        _report(
+            f"{lang} multilingual_cleaners",
+            _best_of(lambda: [_multilingual_cleaners_sequential(text, lang) for text in corpus], args.repeat),
+            _best_of(lambda: [multilingual_cleaners(text, lang) for text in corpus], args.repeat),
+        )
+
+        # The table stages alone, without number expansion
+        normalizer = get_normalizer(lang)
+        lowered = [text.lower() for text in corpus]
+
+        def sequential_tables():
+            for text in lowered:
+                expand_symbols_multilingual(expand_abbreviations_multilingual(text, lang), lang=lang)
+
+        def compiled_tables():
+            for text in lowered:
+                text = normalizer.abbreviations.sub(text, lambda t: expand_abbreviations_multilingual(t, lang))
+                normalizer.symbols.sub(text, lambda t: expand_symbols_multilingual(t, lang=lang)).strip()
+
+        _report(f"{lang} abbreviations+symbols", _best_of(sequential_tables, args.repeat), _best_of(compiled_tables, args.repeat))
+
+
+def bench_numbers(args):
+    import random
+
+    from num2words import num2words
+    from utils.tokenizer import _num2words_cached, number_cache_stats, number_words, warm_number_cache
+
+    # Years, counts and prices repeat a lot in real scripts
+    rng = random.Random(0)
+    values = []
+    for _ in range(args.size):
+        kind = rng.random()
+        if kind < 0.4:
+            values.append((rng.randint(1900, 2030), "cardinal"))
+        elif kind < 0.7:
+            values.append((rng.randint(0, 100), "cardinal"))
+        elif kind < 0.85:
+            values.append((rng.randint(1, 31), "ordinal"))
+        else:
+            values.append((float(rng.choice([0.99, 4.99, 9.99, 19.99, 49.0, 99.0])), "currency"))
+
+    def raw(lang):
+        for value, mode in values:
+            if mode == "currency":
+                num2words(value, to="currency", currency="USD", lang=lang)
+            elif mode == "ordinal":
+                num2words(value, ordinal=True, lang=lang)
+            else:
+                num2words(value, lang=lang)
+
+    def cached(lang):
+        for value, mode in values:
+            number_words(value, lang, mode, "USD" if mode == "currency" else None)
+
+    for lang in args.languages:
+        _num2words_cached.cache_clear()
+        baseline = _best_of(lambda: raw(lang), args.repeat)
+        _report(f"{lang} num2words memo", baseline, _best_of(lambda: cached(lang), args.repeat))
+        warm_number_cache([lang], args.max_value)
+        _report(f"{lang} num2words memo+table", baseline, _best_of(lambda: cached(lang), args.repeat))
+    print(number_cache_stats())
+
+
+def bench_translit(args):
+    import random
+
+    import pypinyin
+    from hangul_romanize import Transliter
+    from hangul_romanize.rule import academic
+    from utils.tokenizer import _chinese_clause, _korean_word, transliterate_batch, transliteration_cache_stats
+
+    def uncached_zh(text):
+        return "".join([p[0] for p in pypinyin.pinyin(text, style=pypinyin.Style.TONE3, heteronym=False, neutral_tone_with_five=True)])
+
+    def uncached_ko(text):
+        return Transliter(academic).translit(text)
+
+    rng = random.Random(0)
+    zh_words = ["你好", "世界", "我们", "中国", "音乐会", "很好", "谢谢", "再见", "银行", "长大了"]
+    ko_words = ["안녕하세요", "한국어", "감사합니다", "값이", "있는", "음악회", "좋아요"]
+    corpora = {
+        "zh": (uncached_zh, ["".join(rng.choice(zh_words) for _ in range(6)) + "，" + rng.choice(zh_words) for _ in range(args.size)]),
+        "ko": (uncached_ko, [" ".join(rng.choice(ko_words) for _ in range(8)) for _ in range(args.size)]),
+    }
+    _chinese_clause.cache_clear()
+    _korean_word.cache_clear()
+    for lang, (uncached, texts) in corpora.items():
+        _report(
+            f"{lang} transliteration",
+            _best_of(lambda: [uncached(text) for text in texts], args.repeat),
+            _best_of(lambda: transliterate_batch(texts, lang), args.repeat),
+        )
+    print(transliteration_cache_stats())
+
+
+def bench_split(args):
+    import random
+
+    from utils.tokenizer import VoiceBpeTokenizer, split_sentences
+
+    tokenizer = VoiceBpeTokenizer(args.vocab)
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            documents = [block.strip() for block in f.read().split("\n\n") if block.strip()]
+    else:
+        rng = random.Random(0)
+        sentences = [
+            "The results were published on 12 March.",
+            "Nobody expected the old bridge to survive another winter, yet it did.",
+            "She paused.",
+            "According to the report, 3.5 million people visited the park last year, which is the highest number since records began in 1920.",
+            "Dr. Smith said the new treatment was promising but that more trials were needed before it could be approved.",
+            "Why not?",
+            "The committee will meet again next Tuesday to discuss the budget, the schedule and the remaining open questions.",
+        ]
+        documents = [" ".join(rng.choice(sentences) for _ in range(rng.randint(10, 60))) for _ in range(args.documents)]
+
+    lang = args.language
+    by_chars = split_sentences(documents, lang, tokenizer.char_limits[lang])
+    by_tokens = tokenizer.split_by_tokens(documents, lang, args.max_tokens)
+    for label, splits in (("char limit", by_chars), ("token budget", by_tokens)):
+        chunks = [chunk for parts in splits for chunk in parts]
+        counts = tokenizer.count_tokens(chunks, lang)
+        print(
+            f"{label:<14} {len(chunks):6d} inference calls   tokens/chunk mean {sum(counts) / len(counts):6.1f}"
+            f" max {max(counts):4d}   chars/chunk max {max(map(len, chunks)):4d}"
+        )
+    print(f"split_by_tokens {_best_of(lambda: tokenizer.split_by_tokens(documents, lang, args.max_tokens), args.repeat) * 1000:.1f} ms")
+
+
+def bench_padding(args):
+    import random
+
+    from utils.length_bucketing import DurationBucketBatchSampler, padded_frames, read_durations
+
+    sample_rate = 22050
+    if args.metadata:
+        durations = list(read_durations(args.metadata).values())
+    else:
+        # format_audio_list keeps clips from 1/3 s up; most sentences are a few seconds long
+        rng = random.Random(0)
+        durations = [min(max(rng.lognormvariate(1.2, 0.6), 0.34), 11.6) for _ in range(args.clips)]
+    lengths = [int(duration * sample_rate) for duration in durations]
+    max_frames = args.batch_size * int(args.max_seconds * sample_rate)
+    lengths = [length if length <= max_frames // args.batch_size else 0 for length in lengths]
+    real = sum(lengths)
+
+    rng = random.Random(1)
+    indices = [i for i, length in enumerate(lengths) if length]
+    rng.shuffle(indices)
+    fixed = [indices[i:i + args.batch_size] for i in range(0, len(indices), args.batch_size)]
+    bucketed = list(DurationBucketBatchSampler(lengths, max_frames, max_batch_size=2 * args.batch_size))
+
+    for label, batches in (("random batches", fixed), ("duration buckets", bucketed)):
+        padded = padded_frames(batches, lengths)
+        peak = max(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+        print(
+            f"{label:<18} {len(batches):6d} batches   padding {1 - real / padded:6.1%}"
+            f"   peak batch {peak / sample_rate:7.1f} s of audio"
+        )
+
+
+def _synthetic_checkpoint(path, model_mb):
+    # Laid out like a trainer checkpoint of the GPT fine-tuning: DVAE included, Adam state for the GPT only
+    import torch
+
+    n = model_mb * (1 << 20) // 4 // 8
+    model = {f"xtts.gpt.layers.{i}.weight": torch.randn(n) for i in range(6)}
+    model["xtts.hifigan_decoder.weight"] = torch.randn(n)
+    model["xtts.dvae.weight"] = torch.randn(n)
+    model["xtts.torch_mel_spectrogram_dvae.mel_basis"] = torch.randn(80, 513)
+    gpt = [key for key in model if key.startswith("xtts.gpt.")]
+    optimizer = {
+        "state": {i: {"step": torch.tensor(1000.0), "exp_avg": torch.randn(n), "exp_avg_sq": torch.rand(n)} for i in range(len(gpt))},
+        "param_groups": [{"lr": 5e-6, "params": list(range(len(gpt)))}],
+    }
+    torch.save({"config": {}, "model": model, "optimizer": optimizer, "scaler": None, "step": 1000, "epoch": 5, "date": ""}, path)
+
+
+def _full_load_export(src, dst):
+    # What the demo's optimize step did before utils.model_export
+    import torch
+
+    checkpoint = torch.load(src, map_location=torch.device("cpu"), weights_only=False)
+    del checkpoint["optimizer"]
+    for key in list(checkpoint["model"].keys()):
+        if "dvae" in key:
+            del checkpoint["model"][key]
+    torch.save(checkpoint, dst)
+
+
+def _lazy_export(src, dst, dtype):
+    from utils.model_export import export_checkpoint
+
+    export_checkpoint(src, dst, dtype=dtype)
+
+
+def _run_measured(target, *args):
+    """(seconds, peak RSS, peak RSS not backed by files) of target(*args) run in a fresh process.
+
+    Memory-mapped checkpoint pages count in RSS but are page cache the OS can
+    drop, the second figure leaves them out where psutil reports them (Linux).
+    """
+    import multiprocessing
+
+    import psutil
+
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    start = time.perf_counter()
+    process.start()
+    watched = psutil.Process(process.pid)
+    peak = peak_anonymous = 0
+    while process.is_alive():
+        try:
+            info = watched.memory_info()
+        except psutil.Error:
+            break
+        peak = max(peak, info.rss)
+        peak_anonymous = max(peak_anonymous, info.rss - getattr(info, "shared", 0))
+        time.sleep(0.005)
+    process.join()
+    elapsed = time.perf_counter() - start
+    if process.exitcode:
+        raise RuntimeError(f"{target.__name__} failed with exit code {process.exitcode}")
+    return elapsed, peak, peak_anonymous
+
+
+def bench_export(args):
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src = args.checkpoint
+        if src is None:
+            src = os.path.join(tmp_dir, "unoptimize_model.pth")
+            _synthetic_checkpoint(src, args.model_mb)
+        print(f"source {os.path.getsize(src) / (1 << 20):9.1f} MB")
+
+        runs = [("full torch.load", _full_load_export, ("model.pth",))]
+        runs += [(f"lazy {dtype or 'fp32'} {ext}", _lazy_export, (f"model_{dtype}.{ext}", dtype)) for ext in ("pth", "safetensors") for dtype in (None, "fp16")]
+        for label, target, (name, *extra) in runs:
+            dst = os.path.join(tmp_dir, name)
+            elapsed, peak, peak_anonymous = _run_measured(target, src, dst, *extra)
+            print(
+                f"{label:<22} {elapsed:7.2f} s   peak RSS {peak / (1 << 20):8.1f} MB (anonymous {peak_anonymous / (1 << 20):8.1f} MB)"
+                f"   output {os.path.getsize(dst) / (1 << 20):8.1f} MB"
+            )
+
+
+def _load_and_wait(checkpoint, config_path, vocab, mapped, loaded, release, results):
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import Xtts
+    from utils.mapped_xtts import MappedXtts
+
+    # Timed from after the imports, they cost the same for both loaders
+    start = time.perf_counter()
+    config = XttsConfig()
+    config.load_json(config_path)
+    # Xtts is the pickle path as it was before utils.mapped_xtts
+    model = MappedXtts(config) if mapped else Xtts.init_from_config(config)
+    model.load_checkpoint(config, checkpoint_path=checkpoint, vocab_path=vocab, use_deepspeed=False)
+    model.eval()
+    results.put(time.perf_counter() - start)
+    loaded.set()
+    # Stays resident until the parent measured every process
+    release.wait()
+
+
+def _drop_page_cache():
+    # Linux and root only, makes the next load read the checkpoint from disk
+    import os
+
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def bench_load(args):
+    import multiprocessing
+    import os
+
+    import psutil
+
+    ctx = multiprocessing.get_context("spawn")
+    for checkpoint in args.checkpoints:
+        # A .pth with the stock Xtts and with MappedXtts (weights not initialized before loading)
+        for loader in ["mapped"] if checkpoint.endswith(".safetensors") else ["xtts", "mapped"]:
+            if args.drop_caches:
+                _drop_page_cache()
+            release = ctx.Event()
+            results = ctx.Queue()
+            events = [ctx.Event() for _ in range(args.processes)]
+            processes = [
+                ctx.Process(target=_load_and_wait, args=(checkpoint, args.config, args.vocab, loader == "mapped", loaded, release, results))
+                for loaded in events
+            ]
+            for process in processes:
+                process.start()
+            for loaded, process in zip(events, processes):
+                while not loaded.wait(0.1):
+                    if not process.is_alive():
+                        raise RuntimeError(f"Loading {checkpoint} failed with exit code {process.exitcode}")
+            seconds = [results.get() for _ in processes]
+            memory = [psutil.Process(process.pid).memory_full_info() for process in processes]
+            release.set()
+            for process in processes:
+                process.join()
+
+            # USS is what each process holds alone, PSS splits the shared pages between the processes mapping them
+            mb = 1 << 20
+            print(
+                f"{os.path.basename(checkpoint):<22} {loader:<7} x{args.processes}"
+                f"   load {max(seconds):6.2f} s   RSS {max(m.rss for m in memory) / mb:8.1f} MB"
+                f"   private total {sum(m.uss for m in memory) / mb:8.1f} MB"
+                f"   PSS total {sum(getattr(m, 'pss', m.uss) for m in memory) / mb:8.1f} MB"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the TTS pipelines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    normalize = subparsers.add_parser("normalize", help="compiled vs sequential multilingual_cleaners")
+    normalize.add_argument("--languages", nargs="+", default=["en", "es", "fr", "de", "ru", "tr"])
+    normalize.add_argument("--size", type=int, default=5000, help="number of texts per language")
+    normalize.add_argument("--repeat", type=int, default=3)
+    normalize.set_defaults(func=bench_normalize)
+
+    numbers = subparsers.add_parser("numbers", help="memoized vs direct num2words")
+    numbers.add_argument("--languages", nargs="+", default=["en", "es", "de"])
+    numbers.add_argument("--size", type=int, default=20000, help="number of values to expand")
+    numbers.add_argument("--max-value", type=int, default=2100, help="size of the warmed integer table")
+    numbers.add_argument("--repeat", type=int, default=3)
+    numbers.set_defaults(func=bench_numbers)
+
+    translit = subparsers.add_parser("translit", help="cached vs per-call zh/ko transliteration")
+    translit.add_argument("--size", type=int, default=2000, help="number of texts per language")
+    translit.add_argument("--repeat", type=int, default=3)
+    translit.set_defaults(func=bench_translit)
+
+    split = subparsers.add_parser("split", help="inference calls with char limit vs token budget splitting")
+    split.add_argument("--vocab", required=True, help="vocab.json of an XTTS model")
+    split.add_argument("--language", default="en")
+    split.add_argument("--max-tokens", type=int, default=None, help="token budget, TEXT_SPLIT_MAX_TOKENS by default")
+    split.add_argument("--text-file", help="documents separated by blank lines, generated ones by default")
+    split.add_argument("--documents", type=int, default=100, help="number of generated documents")
+    split.add_argument("--repeat", type=int, default=3)
+    split.set_defaults(func=bench_split)
+
+    padding = subparsers.add_parser("padding", help="padding of random vs duration bucketed training batches")
+    padding.add_argument("--metadata", help="metadata_train.csv with a duration column, synthetic clips by default")
+    padding.add_argument("--clips", type=int, default=5000, help="number of synthetic clips")
+    padding.add_argument("--batch-size", type=int, default=4)
+    padding.add_argument("--max-seconds", type=float, default=255995 / 22050, help="max_audio_length in seconds")
+    padding.set_defaults(func=bench_padding)
+
+    export = subparsers.add_parser("export", help="optimize step with a full torch.load vs the memory-mapped export")
+    export.add_argument("--checkpoint", help="a training checkpoint (ready/unoptimize_model.pth), synthetic one by default")
+    export.add_argument("--model-mb", type=int, default=1024, help="model weights of the synthetic checkpoint")
+    export.set_defaults(func=bench_export)
+
+    load = subparsers.add_parser("load", help="XTTS cold load from a .pth (pickle) vs a memory-mapped .safetensors")
+    load.add_argument("checkpoints", nargs="+", help="model files of the same model, e.g. ready/model.pth ready/model.safetensors")
+    load.add_argument("--config", required=True, help="config.json of the model")
+    load.add_argument("--vocab", required=True, help="vocab.json of the model")
+    load.add_argument("--processes", type=int, default=2, help="processes loading the model at the same time")
+    load.add_argument("--drop-caches", action="store_true", help="drop the OS page cache before each load (Linux, root)")
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,3 +15,34 @@ MONGO_URL = os.getenv("MONGO_URL")
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
+
+# Background jobs
+DATASET_JOB_WORKERS = int(os.getenv("DATASET_JOB_WORKERS", 1))
+# Fine-tuning runs, each in its own process; more are queued
+TRAIN_JOB_WORKERS = int(os.getenv("TRAIN_JOB_WORKERS", 1))
+# Log lines and metrics kept per training job for /ws/train-logs
+TRAIN_LOG_BUFFER_LINES = int(os.getenv("TRAIN_LOG_BUFFER_LINES", 2000))
+
+# Capacity background jobs are admitted against, see app/core/resources.py.
+# RESOURCE_RAM_MB=0 is all of the RAM; RESOURCE_DEVICES is "auto" (every CUDA device), "" or e.g. "cuda:0,cuda:1"
+RESOURCE_CPU_THREADS = int(os.getenv("RESOURCE_CPU_THREADS", os.cpu_count() or 1))
+RESOURCE_RAM_MB = int(os.getenv("RESOURCE_RAM_MB", 0))
+RESOURCE_DEVICES = os.getenv("RESOURCE_DEVICES", "auto")
+# What each job asks for; the device is "required", "preferred" or "none"
+DATASET_JOB_THREADS = int(os.getenv("DATASET_JOB_THREADS", 4))
+DATASET_JOB_RAM_MB = int(os.getenv("DATASET_JOB_RAM_MB", 6144))
+DATASET_JOB_DEVICE = os.getenv("DATASET_JOB_DEVICE", "preferred")
+TRAIN_JOB_THREADS = int(os.getenv("TRAIN_JOB_THREADS", 8))
+TRAIN_JOB_RAM_MB = int(os.getenv("TRAIN_JOB_RAM_MB", 16384))
+TRAIN_JOB_DEVICE = os.getenv("TRAIN_JOB_DEVICE", "required")
+
+# XTTS inference
+TTS_INFERENCE_WORKERS = int(os.getenv("TTS_INFERENCE_WORKERS", 1))
+TTS_MODEL_MEMORY_BUDGET_MB = int(os.getenv("TTS_MODEL_MEMORY_BUDGET_MB", 4096))
+TTS_STREAM_QUEUE_CHUNKS = int(os.getenv("TTS_STREAM_QUEUE_CHUNKS", 4))
+# Dynamic batching of /synthesize requests, TTS_BATCH_MAX_SIZE=1 disables it
+TTS_BATCH_MAX_SIZE = int(os.getenv("TTS_BATCH_MAX_SIZE", 8))
+TTS_BATCH_MAX_WAIT_MS = int(os.getenv("TTS_BATCH_MAX_WAIT_MS", 15))
+# Number words precomputed at startup, e.g. TTS_NUMBER_CACHE_LANGUAGES=en,es,de
+TTS_NUMBER_CACHE_LANGUAGES = [lang.strip() for lang in os.getenv("TTS_NUMBER_CACHE_LANGUAGES", "en").split(",") if lang.strip()]
+TTS_NUMBER_CACHE_MAX_VALUE = int(os.getenv("TTS_NUMBER_CACHE_MAX_VALUE", 2100))
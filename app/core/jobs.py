@@ -0,0 +1,127 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def report_progress(self, done, total, message=None):
+        # Called from the worker, doubles as the cancellation checkpoint
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        if total:
+            self.progress = round(min(done / total, 1.0), 4)
+        if message is not None:
+            self.message = message
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs blocking work in a bounded thread pool and keeps track of its state."""
+
+    def __init__(self, max_workers=1, max_finished_jobs=200, job_class=Job):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished_jobs = max_finished_jobs
+        self.job_class = job_class
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue `fn(job, *args, **kwargs)` and return the job right away."""
+        job = self.job_class(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_locked()
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.progress = 1.0
+            job.status = "completed"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status in ("completed", "failed", "cancelled"):
+            return job
+        job._cancel_event.set()
+        if job._future is not None and job._future.cancel():
+            # Never started, the worker will not pick it up
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    def _prune_locked(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed", "cancelled")
+        ]
+        for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        for job in self.list():
+            job._cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+from app.core.config import RESOURCE_CPU_THREADS, RESOURCE_DEVICES, RESOURCE_RAM_MB
+from app.core.jobs import JobCancelled
+
+
+class Allocation:
+    """What a job was admitted with: CPU threads, RAM (MB) and a device such as "cuda:0", or None."""
+
+    def __init__(self, kind, threads, ram_mb, device):
+        self.kind = kind
+        self.threads = threads
+        self.ram_mb = ram_mb
+        self.device = device
+        self.started_at = time.time()
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "threads": self.threads,
+            "ram_mb": self.ram_mb,
+            "device": self.device,
+            "started_at": self.started_at,
+        }
+
+
+class ResourceScheduler:
+    """Admits background jobs against a declared capacity of CPU threads, RAM and devices.
+
+    A job states what it needs with `acquire()` and waits while that does not
+    fit next to the jobs already admitted. Waiting jobs are admitted in arrival
+    order, a later one only goes first when the earlier ones still do not fit.
+    Demands larger than the whole capacity are reduced to it so the job can
+    still run on its own. `device` is "required", "preferred" (a free device if
+    there is one, otherwise none) or "none"; on a machine without devices
+    every job runs without one.
+    """
+
+    def __init__(self, cpu_threads, ram_mb=0, devices="auto"):
+        self.cpu_threads = max(1, cpu_threads)
+        # 0 means all of the machine's RAM
+        self.ram_mb = ram_mb or psutil.virtual_memory().total // (1 << 20)
+        self._devices_spec = devices
+        self._devices = None
+        self._used_threads = 0
+        self._used_ram_mb = 0
+        self._busy_devices = set()
+        self._waiting = []
+        self._running = []
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def devices(self):
+        # Resolved on first use: counting CUDA devices here would initialize CUDA in
+        # the training processes before they get to set CUDA_VISIBLE_DEVICES
+        if self._devices is None:
+            if self._devices_spec == "auto":
+                import torch
+
+                self._devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())] if torch.cuda.is_available() else []
+            else:
+                self._devices = [device.strip() for device in self._devices_spec.split(",") if device.strip()]
+        return self._devices
+
+    @contextmanager
+    def acquire(self, kind, threads=1, ram_mb=0, device="none", job=None):
+        """Blocks until the demand fits and yields its Allocation, released on exit.
+
+        With a `job`, its message says it is waiting and cancelling it while
+        waiting raises JobCancelled.
+        """
+        allocation = self._admit(kind, threads, ram_mb, device, job)
+        try:
+            yield allocation
+        finally:
+            with self._cond:
+                self._used_threads -= allocation.threads
+                self._used_ram_mb -= allocation.ram_mb
+                self._busy_devices.discard(allocation.device)
+                self._running.remove(allocation)
+                self._cond.notify_all()
+
+    def _admit(self, kind, threads, ram_mb, device, job):
+        demand = {
+            "ticket": next(self._tickets),
+            "kind": kind,
+            "threads": min(max(1, threads), self.cpu_threads),
+            "ram_mb": min(max(0, ram_mb), self.ram_mb),
+            "device": device if self.devices else "none",
+        }
+        with self._cond:
+            self._waiting.append(demand)
+            try:
+                while True:
+                    if job is not None and job.cancel_requested:
+                        raise JobCancelled()
+                    earlier = itertools.takewhile(lambda waiting: waiting is not demand, self._waiting)
+                    if self._fits_locked(demand) and not any(self._fits_locked(waiting) for waiting in earlier):
+                        return self._allocate_locked(demand)
+                    if job is not None:
+                        job.message = "Waiting for resources"
+                    # Timeout so cancellation is noticed while nothing is released
+                    self._cond.wait(timeout=0.5)
+            finally:
+                self._waiting.remove(demand)
+                self._cond.notify_all()
+
+    def _free_devices_locked(self):
+        return [device for device in self.devices if device not in self._busy_devices]
+
+    def _fits_locked(self, demand):
+        return (
+            self._used_threads + demand["threads"] <= self.cpu_threads
+            and self._used_ram_mb + demand["ram_mb"] <= self.ram_mb
+            and (demand["device"] != "required" or self._free_devices_locked())
+        )
+
+    def _allocate_locked(self, demand):
+        device = None
+        if demand["device"] in ("required", "preferred"):
+            free = self._free_devices_locked()
+            device = free[0] if free else None
+        allocation = Allocation(demand["kind"], demand["threads"], demand["ram_mb"], device)
+        self._used_threads += allocation.threads
+        self._used_ram_mb += allocation.ram_mb
+        if device is not None:
+            self._busy_devices.add(device)
+        self._running.append(allocation)
+        return allocation
+
+    def stats(self):
+        with self._cond:
+            return {
+                "capacity": {"threads": self.cpu_threads, "ram_mb": self.ram_mb, "devices": self.devices},
+                "used": {"threads": self._used_threads, "ram_mb": self._used_ram_mb, "devices": sorted(self._busy_devices)},
+                "running": [allocation.to_dict() for allocation in self._running],
+                "waiting": [{key: demand[key] for key in ("kind", "threads", "ram_mb", "device")} for demand in self._waiting],
+            }
+
+
+resource_scheduler = ResourceScheduler(RESOURCE_CPU_THREADS, RESOURCE_RAM_MB, RESOURCE_DEVICES)
@@ -10,22 +10,36 @@ from jose import jwt, JWTError
 
 from typing import List
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from pathlib import Path
 
 from app.core.token_store import token_blacklist
 
 # Import routers
-from app.api import auth, tts
+from app.api import auth, train, tts, websocket_xtts
 from app.db.mongo import otp_collection  
-from app.core.config import JWT_ALGORITHM, JWT_SECRET
+from app.services.training_service import training_jobs
+from app.services.xtts_service import batch_scheduler, inference_executor
+from app.core.config import JWT_ALGORITHM, JWT_SECRET, TTS_NUMBER_CACHE_LANGUAGES, TTS_NUMBER_CACHE_MAX_VALUE
+from app.utils.tokenizer import warm_number_cache
 
 
 # App lifespan event for DB indexes etc.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await otp_collection.create_index("email", unique=True)
+    # Fill the number word tables in the background, requests don't wait for it
+    number_warmup = asyncio.create_task(
+        asyncio.to_thread(warm_number_cache, TTS_NUMBER_CACHE_LANGUAGES, TTS_NUMBER_CACHE_MAX_VALUE)
+    )
     yield
+    await number_warmup
+    tts.dataset_jobs.shutdown()
+    # Cancelling stops the training processes too
+    training_jobs.shutdown()
+    batch_scheduler.shutdown()
+    inference_executor.shutdown(wait=False, cancel_futures=True)
 
 # app
 app = FastAPI(lifespan=lifespan)
@@ -106,7 +120,8 @@ app.add_middleware(
 # Register routers
 app.include_router(auth.auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(tts.tts_router, prefix="/api/tts", tags=["tts"])
-# app.include_router(websocket.websocket_router, tags=["websocket"])
+app.include_router(train.train_router, prefix="/api/train", tags=["train"])
+app.include_router(websocket_xtts.router, prefix="/ws", tags=["websocket"])
 
 
 # Serve static files
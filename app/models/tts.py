@@ -1,8 +1,56 @@
 from pydantic import BaseModel
+from typing import Literal, Optional
 
 class ModelRequest(BaseModel):
     name: str
 
 class DatasetProcessRequest(BaseModel):
     name: str
-    audio_folder: str 
\ No newline at end of file
+    audio_folder: str
+
+class SynthesizeRequest(BaseModel):
+    name: str
+    text: str
+    language: str = "en"
+    temperature: float = 0.75
+    length_penalty: float = 1.0
+    repetition_penalty: float = 5.0
+    top_k: int = 50
+    top_p: float = 0.85
+    enable_text_splitting: bool = True
+    # Pins the sampling, identical seeded requests are served from the audio cache
+    seed: Optional[int] = None
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: float
+    message: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class TrainRequest(BaseModel):
+    name: str
+    language: str = "en"
+    epochs: int = 6
+    batch_size: int = 2
+    grad_acumm: int = 1
+    # Seconds, longer clips are left out of training
+    max_audio_length: float = 11
+    version: str = "v2.0.2"
+    # Path of a .pth checkpoint to fine-tune instead of the base model
+    custom_model: str = ""
+
+class OptimizeRequest(BaseModel):
+    name: str
+    # "fp16" or "bf16" to down-cast the weights, full precision otherwise
+    dtype: Optional[Literal["fp16", "bf16"]] = None
+    # safetensors models are memory-mapped when loaded
+    format: Literal["pth", "safetensors"] = "pth"
+
+class TrainingJobOut(JobOut):
+    metrics: dict = {}
@@ -0,0 +1,290 @@
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from itertools import islice
+from pathlib import Path
+
+from app.core.config import TRAIN_JOB_DEVICE, TRAIN_JOB_RAM_MB, TRAIN_JOB_THREADS, TRAIN_JOB_WORKERS, TRAIN_LOG_BUFFER_LINES
+from app.core.jobs import Job, JobCancelled, JobManager
+from app.core.resources import resource_scheduler
+
+
+VOICE_MODEL_ROOT = Path("voice_models")
+# Seconds between two metric updates sent by a training process
+METRICS_INTERVAL = 1.0
+# Seconds a cancelled training process gets to save its checkpoint before it is killed
+STOP_GRACE_SECONDS = 300
+
+
+class LogBuffer:
+    """The last `maxlen` entries of a job, numbered so readers can follow it incrementally."""
+
+    def __init__(self, maxlen):
+        self._entries = deque(maxlen=maxlen)
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        with self._lock:
+            self._entries.append({"seq": self._next_seq, "time": time.time(), **entry})
+            self._next_seq += 1
+
+    def read(self, since=0):
+        """(entries numbered `since` and up, seq to read from next time, entries dropped before the reader got them)"""
+        with self._lock:
+            first = self._next_seq - len(self._entries)
+            start = max(since, first)
+            entries = list(islice(self._entries, start - first, None))
+            return entries, self._next_seq, max(first - since, 0)
+
+
+class TrainingJob(Job):
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.logs = LogBuffer(TRAIN_LOG_BUFFER_LINES)
+        self.metrics = {}
+
+    def to_dict(self):
+        return {**super().to_dict(), "metrics": self.metrics}
+
+
+training_jobs = JobManager(max_workers=TRAIN_JOB_WORKERS, job_class=TrainingJob)
+
+
+def run_training_job(job, params):
+    """Runs train_voice_model(**params) in a child process and relays its output into `job`.
+
+    Cancelling the job asks the process to stop, the trainer then saves a
+    checkpoint the job can be resumed from. The job waits until the resource
+    scheduler admits it and the process is confined to what it was given.
+    """
+    with resource_scheduler.acquire(
+        "train", threads=TRAIN_JOB_THREADS, ram_mb=TRAIN_JOB_RAM_MB, device=TRAIN_JOB_DEVICE, job=job
+    ) as allocation:
+        return _run_training_process(job, params, allocation)
+
+
+def _run_training_process(job, params, allocation):
+    ctx = multiprocessing.get_context("spawn")
+    events = ctx.Queue()
+    # An event rather than SIGTERM: terminate() is TerminateProcess on Windows, nothing gets saved
+    stop = ctx.Event()
+    process = ctx.Process(target=_training_process, args=(events, stop, params, allocation.to_dict()), name=f"train-{job.id[:8]}")
+    job.message = "Starting training process"
+    process.start()
+
+    outcome = {}
+    try:
+        while not job.cancel_requested:
+            if not _relay_event(job, events, outcome) and not process.is_alive():
+                break
+        else:
+            raise JobCancelled()
+    finally:
+        if process.is_alive():
+            job.message = "Stopping, saving a checkpoint"
+            stop.set()
+        # Keep reading: a process blocked on a full queue never exits
+        deadline = time.time() + STOP_GRACE_SECONDS
+        while _relay_event(job, events, outcome) or process.is_alive():
+            if time.time() > deadline:
+                process.kill()
+                break
+        process.join()
+        events.close()
+
+    if "error" in outcome:
+        raise RuntimeError(outcome["error"])
+    if process.exitcode == 130:
+        # What the trainer exits with once it saved a checkpoint after a stop request
+        raise RuntimeError("Training was interrupted, resume it to continue from the saved checkpoint")
+    if "result" not in outcome:
+        raise RuntimeError(f"Training process exited with code {process.exitcode}")
+    job.message = "✅ Model training done!"
+    return outcome["result"]
+
+
+def _relay_event(job, events, outcome):
+    """Handles the next message of the training process, False when none came in time."""
+    try:
+        kind, payload = events.get(timeout=0.5)
+    except queue.Empty:
+        return False
+
+    if kind == "log":
+        job.logs.append({"type": "log", "line": payload})
+    elif kind == "metrics":
+        job.metrics = payload
+        job.logs.append({"type": "metrics", **payload})
+        if payload["total_steps"]:
+            job.progress = round(min(payload["step"] / payload["total_steps"], 1.0), 4)
+        job.message = f"Epoch {payload['epoch'] + 1}/{payload['epochs']}"
+    else:
+        # "result" or "error"
+        outcome[kind] = payload
+    return True
+
+
+class _QueueWriter:
+    # sys.stdout / sys.stderr of the training process, sends one message per line.
+    # tqdm redraws with \r, every redraw becomes a line of its own
+    encoding = "utf-8"
+
+    def __init__(self, events):
+        self._events = events
+        self._partial = ""
+
+    def write(self, text):
+        *lines, self._partial = re.split(r"[\r\n]", self._partial + text)
+        for line in lines:
+            if line.strip():
+                self._events.put(("log", line))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _limit_resources(allocation):
+    # Before torch is imported: the OpenMP pools and CUDA read these once
+    os.environ["CUDA_VISIBLE_DEVICES"] = allocation["device"].rpartition(":")[2] if allocation["device"] else ""
+    # Half of the threads for the data loader processes, one thread each
+    loader_workers = allocation["threads"] // 2
+    torch_threads = str(allocation["threads"] - loader_workers)
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = torch_threads
+    return loader_workers
+
+
+def _training_process(events, stop, params, allocation):
+    sys.stdout = sys.stderr = _QueueWriter(events)
+    try:
+        loader_workers = _limit_resources(allocation)
+        print(f" > Training with {allocation['threads']} threads ({loader_workers} data loader workers) on {allocation['device'] or 'CPU'}")
+        result = train_voice_model(**params, num_loader_workers=loader_workers, callbacks=_metrics_callbacks(events), stop_event=stop)
+        events.put(("result", result))
+    except SystemExit as e:
+        # Trainer.fit() prints the traceback of whatever failed and calls sys.exit(1)
+        # while handling it, the failure is the exit's context
+        cause = e.__context__
+        if cause is not None:
+            events.put(("error", f"{type(cause).__name__}: {cause}"))
+        else:
+            events.put(("error", f"Training exited with code {e.code}, see the job logs for the cause"))
+    except BaseException as e:
+        traceback.print_exc()
+        events.put(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        sys.stdout.write("\n")
+
+
+def _trainer_metrics(trainer):
+    steps_per_epoch = len(trainer.train_loader) if trainer.train_loader is not None else 0
+    metrics = {
+        "epoch": trainer.epochs_done,
+        "epochs": trainer.config.epochs,
+        "step": trainer.total_steps_done,
+        "total_steps": steps_per_epoch * trainer.config.epochs,
+    }
+    for name, keep_avg in (("train", trainer.keep_avg_train), ("eval", trainer.keep_avg_eval)):
+        if keep_avg is not None:
+            metrics[name] = {key.removeprefix("avg_"): float(value) for key, value in keep_avg.avg_values.items()}
+    return metrics
+
+
+def _metrics_callbacks(events):
+    last_sent = 0.0
+
+    def on_train_step_end(trainer):
+        nonlocal last_sent
+        if time.time() - last_sent >= METRICS_INTERVAL:
+            last_sent = time.time()
+            events.put(("metrics", _trainer_metrics(trainer)))
+
+    def on_epoch_end(trainer):
+        events.put(("metrics", _trainer_metrics(trainer)))
+
+    return {"on_train_step_end": on_train_step_end, "on_epoch_end": on_epoch_end}
+
+
+def train_voice_model(model_dir, language, num_epochs, batch_size, grad_acumm, max_audio_length, version="v2.0.2", custom_model="", resume=False, num_loader_workers=None, callbacks=None, stop_event=None):
+    """Fine-tunes XTTS on <model_dir>/dataset and puts the result in <model_dir>/ready (same steps as the Gradio demo).
+
+    With `resume` the latest run under <model_dir>/run/training is continued
+    from its last checkpoint instead of starting over. Setting `stop_event`
+    stops the training with a checkpoint.
+    """
+    # Imported here: the trainer logger binds sys.stderr on import, which has to be the redirected one
+    from app.utils.gpt_train import train_gpt
+
+    model_dir = Path(model_dir)
+    dataset_dir = model_dir / "dataset"
+    train_csv = dataset_dir / "metadata_train.csv"
+    eval_csv = dataset_dir / "metadata_eval.csv"
+    if not train_csv.exists() or not eval_csv.exists():
+        raise FileNotFoundError(f"No processed dataset in {dataset_dir}, run the dataset processing step first")
+
+    lang_file_path = dataset_dir / "lang.txt"
+    if lang_file_path.exists():
+        dataset_language = lang_file_path.read_text(encoding="utf-8").strip()
+        if dataset_language and dataset_language != language:
+            print(f"The dataset was prepared for '{dataset_language}', training in that language instead of '{language}'")
+            language = dataset_language
+
+    run_dir = model_dir / "run"
+    if run_dir.exists() and not resume:
+        shutil.rmtree(run_dir)
+
+    speaker_xtts_path, config_path, _, vocab_file, exp_path, speaker_wav = train_gpt(
+        custom_model, version, language, num_epochs, batch_size, grad_acumm, str(train_csv), str(eval_csv),
+        output_path=str(model_dir),
+        # seconds to waveform frames
+        max_audio_length=int(max_audio_length * 22050),
+        callbacks=callbacks,
+        resume=resume,
+        num_loader_workers=num_loader_workers,
+        stop_event=stop_event,
+    )
+
+    ready_dir = model_dir / "ready"
+    ft_xtts_checkpoint = ready_dir / "unoptimize_model.pth"
+    shutil.copy(Path(exp_path) / "best_model.pth", ft_xtts_checkpoint)
+    speaker_reference = ready_dir / "reference.wav"
+    shutil.copy(speaker_wav, speaker_reference)
+
+    print("Model training done!")
+    return {
+        "model_dir": str(model_dir),
+        "language": language,
+        "checkpoint": str(ft_xtts_checkpoint),
+        "config": str(config_path),
+        "vocab": str(vocab_file),
+        "speaker": str(speaker_xtts_path),
+        "reference": str(speaker_reference),
+    }
+
+
+def optimize_voice_model(model_dir, dtype=None, fmt="pth"):
+    """Exports <model_dir>/ready/unoptimize_model.pth to ready/model.pth (or model.safetensors) with only the inference weights.
+
+    `dtype` ("fp16" / "bf16") down-casts the weights. The source checkpoint is
+    removed afterwards, like the Gradio demo's optimize step does.
+    """
+    from app.utils.model_export import export_ready_model
+
+    ready_dir = Path(model_dir) / "ready"
+    if not (ready_dir / "unoptimize_model.pth").is_file():
+        raise FileNotFoundError(f"No unoptimized model in {ready_dir}, train the model first")
+
+    optimized = Path(export_ready_model(ready_dir, dtype=dtype, fmt=fmt))
+    return {"checkpoint": str(optimized), "size_bytes": optimized.stat().st_size, "dtype": dtype or "fp32", "format": fmt}
@@ -0,0 +1,295 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+import torch.nn.functional as F
+
+
+def _prefix_embedding(gpt, cond_latent, text_tokens):
+    # Same layout as GPT.compute_embeddings: [cond | start, text..., stop]
+    text_tokens = F.pad(text_tokens, (0, 1), value=gpt.stop_text_token)
+    text_tokens = F.pad(text_tokens, (1, 0), value=gpt.start_text_token)
+    emb = gpt.text_embedding(text_tokens) + gpt.text_pos_embedding(text_tokens)
+    return torch.cat([cond_latent, emb], dim=1)
+
+
+def _pad_embeddings(embs, left):
+    """Stack (1, T, D) embeddings into (B, T_max, D) plus the matching attention mask.
+
+    The XTTS transformer has no position embeddings of its own (text and mel
+    positions are added before it), so masked padding does not change the
+    output of the other rows.
+    """
+    max_len = max(emb.shape[1] for emb in embs)
+    padded = embs[0].new_zeros(len(embs), max_len, embs[0].shape[-1])
+    mask = torch.zeros(len(embs), max_len, dtype=torch.long, device=embs[0].device)
+    for i, emb in enumerate(embs):
+        length = emb.shape[1]
+        if left:
+            padded[i, max_len - length:] = emb[0]
+            mask[i, max_len - length:] = 1
+        else:
+            padded[i, :length] = emb[0]
+            mask[i, :length] = 1
+    return padded, mask
+
+
+def _trim_codes(gpt, codes):
+    # Rows that finished early are padded with the stop token, keep up to the first one
+    # (inclusive) like a single generate() would
+    stops = (codes == gpt.stop_audio_token).nonzero()
+    end = int(stops[0]) + 1 if len(stops) else codes.shape[-1]
+    return codes[:end].unsqueeze(0)
+
+
+@torch.no_grad()
+def generate_codes(gpt, cond_latents, text_tokens, **generate_kwargs):
+    """Batched `GPT.generate` over texts of different lengths, returns one (1, L) code tensor per text."""
+    prefix, prefix_mask = _pad_embeddings(
+        [_prefix_embedding(gpt, cond, tokens) for cond, tokens in zip(cond_latents, text_tokens)], left=True
+    )
+    gpt.gpt_inference.store_prefix_emb(prefix)
+    batch_size, prefix_len = prefix_mask.shape
+    gpt_inputs = torch.full((batch_size, prefix_len + 1), fill_value=1, dtype=torch.long, device=prefix.device)
+    gpt_inputs[:, -1] = gpt.start_audio_token
+    codes = gpt.gpt_inference.generate(
+        gpt_inputs,
+        bos_token_id=gpt.start_audio_token,
+        pad_token_id=gpt.stop_audio_token,
+        eos_token_id=gpt.stop_audio_token,
+        max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+        attention_mask=F.pad(prefix_mask, (0, 1), value=1),
+        **generate_kwargs,
+    )
+    return [_trim_codes(gpt, row) for row in codes[:, gpt_inputs.shape[-1]:]]
+
+
+@torch.no_grad()
+def gpt_latents(gpt, cond_latents, text_tokens, codes):
+    """Batched equivalent of `GPT.forward(..., return_latent=True)` for inference."""
+    prefix, prefix_mask = _pad_embeddings(
+        [_prefix_embedding(gpt, cond, tokens) for cond, tokens in zip(cond_latents, text_tokens)], left=True
+    )
+    mel_embs = []
+    for item_codes in codes:
+        # [start, codes..., 4 x stop], the padding GPT.forward builds for one clip
+        mel = F.pad(item_codes, (0, 4), value=gpt.stop_audio_token)
+        mel = F.pad(mel, (1, 0), value=gpt.start_audio_token)
+        mel_embs.append(gpt.mel_embedding(mel) + gpt.mel_pos_embedding(mel))
+    mel, mel_mask = _pad_embeddings(mel_embs, left=False)
+
+    hidden = gpt.gpt(
+        inputs_embeds=torch.cat([prefix, mel], dim=1),
+        attention_mask=torch.cat([prefix_mask, mel_mask], dim=1),
+        return_dict=True,
+    ).last_hidden_state
+    hidden = gpt.final_norm(hidden[:, prefix.shape[1]:])
+    # GPT.forward drops the last 5 positions of the mel sequence
+    return [hidden[i:i + 1, :emb.shape[1] - 5] for i, emb in enumerate(mel_embs)]
+
+
+@torch.no_grad()
+def decode_latents(model, latents, speaker_embedding):
+    """HiFi-GAN decode, latents of the same length go through the decoder together."""
+    wavs = [None] * len(latents)
+    by_length = OrderedDict()
+    for i, item_latents in enumerate(latents):
+        by_length.setdefault(item_latents.shape[1], []).append(i)
+    for indices in by_length.values():
+        batch = torch.cat([latents[i] for i in indices], dim=0)
+        g = speaker_embedding.expand(len(indices), *speaker_embedding.shape[1:])
+        out = model.hifigan_decoder(batch, g=g).cpu()
+        for row, i in enumerate(indices):
+            wavs[i] = out[row].squeeze()
+    return wavs
+
+
+def batched_inference(model, texts, language, gpt_cond_latent, speaker_embedding, max_batch_size=8, temperature=0.75, length_penalty=1.0, repetition_penalty=5.0, top_k=50, top_p=0.85, enable_text_splitting=True):
+    """`Xtts.inference` for several texts sharing a speaker, language and sampling settings.
+
+    Sentences of all texts are pooled and run through the GPT and decoder
+    `max_batch_size` at a time. Returns one result per text: a float32 numpy
+    waveform, or the exception raised while preparing that text.
+    """
+    language = language.split("-")[0]
+    gpt_cond_latent = gpt_cond_latent.to(model.device)
+    speaker_embedding = speaker_embedding.to(model.device)
+
+    results = [None] * len(texts)
+    if enable_text_splitting:
+        splits = model.tokenizer.split_by_tokens(texts, language)
+    else:
+        splits = [[text] for text in texts]
+
+    # One tokenizer call for every sentence of every text
+    flat = [sent.strip().lower() for parts in splits for sent in parts]
+    try:
+        flat_ids = model.tokenizer.encode_batch(flat, language)
+    except Exception as e:
+        return [e] * len(texts)
+
+    sentences = []
+    offset = 0
+    for index, parts in enumerate(splits):
+        ids = flat_ids[offset:offset + len(parts)]
+        offset += len(parts)
+        try:
+            tokens = []
+            for sent_ids in ids:
+                sent_tokens = torch.IntTensor(sent_ids).unsqueeze(0)
+                if sent_tokens.shape[-1] >= model.args.gpt_max_text_tokens:
+                    raise ValueError("XTTS can only generate text with a maximum of 400 tokens.")
+                tokens.append(sent_tokens.to(model.device))
+            if not tokens:
+                raise ValueError("Nothing to synthesize.")
+        except Exception as e:
+            results[index] = e
+            continue
+        sentences.extend((index, position, sent_tokens) for position, sent_tokens in enumerate(tokens))
+
+    # Similar lengths together keeps the padding small
+    sentences.sort(key=lambda item: item[2].shape[-1])
+    wavs = {}
+    for start in range(0, len(sentences), max(1, max_batch_size)):
+        chunk = sentences[start:start + max_batch_size]
+        text_tokens = [item[2] for item in chunk]
+        cond_latents = [gpt_cond_latent] * len(chunk)
+        codes = generate_codes(
+            model.gpt,
+            cond_latents,
+            text_tokens,
+            do_sample=True,
+            top_p=top_p,
+            top_k=top_k,
+            temperature=temperature,
+            num_return_sequences=1,
+            num_beams=1,
+            length_penalty=length_penalty,
+            repetition_penalty=float(repetition_penalty),
+            output_attentions=False,
+        )
+        latents = gpt_latents(model.gpt, cond_latents, text_tokens, codes)
+        for (index, position, _), wav in zip(chunk, decode_latents(model, latents, speaker_embedding)):
+            wavs[(index, position)] = wav
+
+    for index in range(len(texts)):
+        if results[index] is None:
+            parts = [wavs[key] for key in sorted(key for key in wavs if key[0] == index)]
+            results[index] = torch.cat(parts, dim=0).numpy()
+    return results
+
+
+class BatchItem:
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.future = Future()
+
+
+class XttsBatchScheduler:
+    """Dynamic batching in front of the inference pool.
+
+    The first pending request opens a batch window of `max_wait_ms`; requests
+    arriving within it (up to `max_batch_size`) are grouped by key, e.g.
+    (model, language, sampling settings), and each group is passed to
+    `run_batch(key, texts)`, which returns one waveform or exception per text.
+    A new window only opens once a worker is free, so under load batches fill
+    up instead of queueing behind each other.
+    """
+
+    def __init__(self, run_batch, executor, workers, max_batch_size=8, max_wait_ms=15):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._slots = threading.Semaphore(max(1, workers))
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    def submit(self, key, text):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="xtts-batcher", daemon=True)
+                self._thread.start()
+        item = BatchItem(key, text)
+        self._queue.put(item)
+        return item.future
+
+    def shutdown(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _collect(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._slots.acquire()
+            pending = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+
+            groups = OrderedDict()
+            for item in pending:
+                groups.setdefault(item.key, []).append(item)
+            for i, (key, items) in enumerate(groups.items()):
+                # The first group uses the slot taken before the window opened
+                if i:
+                    self._slots.acquire()
+                try:
+                    self.executor.submit(self._run_group, key, items)
+                except RuntimeError as e:
+                    # Executor already shut down
+                    self._slots.release()
+                    for item in items:
+                        item.future.set_exception(e)
+
+    def _run_group(self, key, items):
+        try:
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(items)
+                self.largest_batch = max(self.largest_batch, len(items))
+            try:
+                results = self.run_batch(key, [item.text for item in items])
+            except Exception as e:
+                results = [e] * len(items)
+            for item, result in zip(items, results):
+                if isinstance(result, Exception):
+                    item.future.set_exception(result)
+                else:
+                    item.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "requests": self.requests,
+                "largest_batch": self.largest_batch,
+                "average_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+            }
@@ -0,0 +1,392 @@
+import asyncio
+import gc
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import soundfile
+import torch
+from TTS.tts.configs.xtts_config import XttsConfig
+
+from app.core.config import TTS_BATCH_MAX_SIZE, TTS_BATCH_MAX_WAIT_MS, TTS_INFERENCE_WORKERS, TTS_MODEL_MEMORY_BUDGET_MB
+from app.services.xtts_batching import XttsBatchScheduler, batched_inference
+from app.utils.audio_cache import is_deterministic, synthesis_cache
+from app.utils.latent_cache import latent_cache, model_id_for_checkpoint
+from app.utils.mapped_xtts import MappedXtts
+from app.utils.model_export import OPTIMIZED_MODEL_FILES
+from app.utils.tokenizer import VoiceBpeTokenizer
+
+
+VOICE_MODEL_ROOT = Path("voice_models")
+OUTPUT_SAMPLE_RATE = 24000
+
+
+class ModelNotFoundError(Exception):
+    pass
+
+
+def resolve_ready_files(model_name, root=VOICE_MODEL_ROOT):
+    """Paths of a fine-tuned model in voice_models/<name>/ready (same layout as the Gradio demo).
+
+    The checkpoint is the optimized model, model.safetensors (memory-mapped)
+    before model.pth, or unoptimize_model.pth when the model was not optimized.
+    """
+    ready_dir = Path(root) / model_name / "ready"
+    candidates = [ready_dir / name for name in OPTIMIZED_MODEL_FILES.values()] + [ready_dir / "unoptimize_model.pth"]
+    checkpoint = next((path for path in candidates if path.exists()), candidates[-1])
+
+    files = {
+        "checkpoint": checkpoint,
+        "config": ready_dir / "config.json",
+        "vocab": ready_dir / "vocab.json",
+        "speaker": ready_dir / "speakers_xtts.pth",
+        "reference": ready_dir / "reference.wav",
+    }
+    missing = [name for name in ("checkpoint", "config", "vocab", "reference") if not files[name].exists()]
+    if missing:
+        raise ModelNotFoundError(f"Model '{model_name}' is not ready (missing: {', '.join(missing)})")
+    return files
+
+
+def _model_memory_bytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class LoadedModel:
+    def __init__(self, name, model, files, load_seconds):
+        self.name = name
+        self.model = model
+        self.files = files
+        self.load_seconds = load_seconds
+        self.memory_bytes = _model_memory_bytes(model)
+        self.model_id = model_id_for_checkpoint(files["checkpoint"])
+        # Conditioning latents are persisted next to the model
+        self.latent_dir = files["checkpoint"].parent / "latents"
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        # XTTS inference is not re-entrant, one generation per model at a time
+        self.lock = threading.Lock()
+
+
+class XttsModelManager:
+    """Keeps fine-tuned XTTS models resident, dropping the least recently used
+    ones when the total weight size goes over `memory_budget_bytes`.
+
+    A resident model is reloaded once the checkpoint in its ready/ folder is
+    replaced (retraining, optimization).
+    """
+
+    def __init__(self, root=VOICE_MODEL_ROOT, memory_budget_bytes=TTS_MODEL_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.memory_budget_bytes = memory_budget_bytes
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.evictions = 0
+
+    def _checkpoint_id(self, name):
+        # None while ready/ is incomplete (e.g. being rewritten), the resident model is kept then
+        try:
+            return model_id_for_checkpoint(resolve_ready_files(name, self.root)["checkpoint"])
+        except (ModelNotFoundError, OSError):
+            return None
+
+    def get(self, name):
+        checkpoint_id = self._checkpoint_id(name)
+        while True:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None and checkpoint_id is not None and entry.model_id != checkpoint_id:
+                    # Requests already holding the entry finish on the old weights
+                    del self._models[name]
+                    print(f" > Checkpoint of XTTS model {name} changed, reloading")
+                    entry = None
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    entry.last_used = time.time()
+                    return entry
+
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            entry = self._load(name)
+        finally:
+            with self._lock:
+                del self._loading[name]
+            loading.set()
+
+        with self._lock:
+            self._models[name] = entry
+            self._evict_locked()
+        return entry
+
+    def _load(self, name):
+        files = resolve_ready_files(name, self.root)
+        start = time.perf_counter()
+        config = XttsConfig()
+        config.load_json(str(files["config"]))
+        model = MappedXtts(config)
+        print(f" > Loading XTTS model {name}")
+        model.load_checkpoint(
+            config,
+            checkpoint_path=str(files["checkpoint"]),
+            vocab_path=str(files["vocab"]),
+            speaker_file_path=str(files["speaker"]),
+            use_deepspeed=False,
+        )
+        # The app tokenizer: same vocab and ids, plus the cached normalizer and encode_batch
+        model.tokenizer = VoiceBpeTokenizer(vocab_file=str(files["vocab"]))
+        if torch.cuda.is_available():
+            model.cuda()
+        model.eval()
+        return LoadedModel(name, model, files, time.perf_counter() - start)
+
+    def _evict_locked(self):
+        evicted = False
+        # Always keep the model that was just requested
+        while len(self._models) > 1 and self._resident_bytes_locked() > self.memory_budget_bytes:
+            name, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            evicted = True
+            print(f" > Evicted XTTS model {name}")
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def _resident_bytes_locked(self):
+        return sum(entry.memory_bytes for entry in self._models.values())
+
+    def unload(self, name):
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is not None:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return entry is not None
+
+    def stats(self):
+        with self._lock:
+            models = [
+                {
+                    "name": entry.name,
+                    "checkpoint": str(entry.files["checkpoint"]),
+                    "memory_bytes": entry.memory_bytes,
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "loaded_at": entry.loaded_at,
+                    "last_used": entry.last_used,
+                }
+                for entry in self._models.values()
+            ]
+            resident_bytes = self._resident_bytes_locked()
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "resident_bytes": resident_bytes,
+            "evictions": self.evictions,
+            "models": models,
+            "latent_cache": latent_cache.stats(),
+            "audio_cache": synthesis_cache.stats(),
+        }
+
+
+xtts_manager = XttsModelManager()
+inference_executor = ThreadPoolExecutor(max_workers=max(1, TTS_INFERENCE_WORKERS), thread_name_prefix="xtts")
+
+
+def _split_text(model, text, language, enable_text_splitting):
+    # Chunks filled up to the token budget instead of XTTS's per-language character limit
+    if not enable_text_splitting:
+        return [text]
+    return model.tokenizer.split_by_tokens([text], language)[0]
+
+
+class RandomStateGate:
+    """Keeps seeded generations reproducible while other models generate in parallel.
+
+    XTTS samples from torch's process-wide RNG, so a seeded generation must not
+    share it: it runs alone, with the RNG forked for its duration, while
+    unseeded generations run side by side. Seeded ones are admitted first so
+    they do not starve. A seeded stream holds the gate until it is delivered,
+    a slow client delays every other generation.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    @contextmanager
+    def use(self, seed=None):
+        if seed is None:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._exclusive and not self._exclusive_waiting)
+                self._shared += 1
+            try:
+                yield
+            finally:
+                with self._cond:
+                    self._shared -= 1
+                    self._cond.notify_all()
+            return
+
+        with self._cond:
+            self._exclusive_waiting += 1
+            self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+            self._exclusive_waiting -= 1
+            self._exclusive = True
+        try:
+            devices = [torch.cuda.current_device()] if torch.cuda.is_available() else []
+            with torch.random.fork_rng(devices=devices):
+                torch.manual_seed(seed)
+                yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+random_state = RandomStateGate()
+
+
+def synthesize(name, text, language="en", temperature=0.75, length_penalty=1.0, repetition_penalty=5.0, top_k=50, top_p=0.85, enable_text_splitting=True, seed=None):
+    """Blocking synthesis, returns a float32 numpy waveform at OUTPUT_SAMPLE_RATE."""
+    entry = xtts_manager.get(name)
+    model = entry.model
+    with entry.lock, random_state.use(seed):
+        gpt_cond_latent, speaker_embedding = latent_cache.get_or_compute(
+            model, entry.model_id, str(entry.files["reference"]), cache_dir=str(entry.latent_dir)
+        )
+        wavs = []
+        for chunk in _split_text(model, text, language, enable_text_splitting):
+            out = model.inference(
+                text=chunk,
+                language=language,
+                gpt_cond_latent=gpt_cond_latent,
+                speaker_embedding=speaker_embedding,
+                temperature=temperature,
+                length_penalty=length_penalty,
+                repetition_penalty=float(repetition_penalty),
+                top_k=top_k,
+                top_p=top_p,
+                enable_text_splitting=False,
+            )
+            wavs.append(np.asarray(out["wav"]))
+    return np.concatenate(wavs)
+
+
+def _synthesize_batch(key, texts):
+    name, language, params = key
+    entry = xtts_manager.get(name)
+    with entry.lock, random_state.use():
+        gpt_cond_latent, speaker_embedding = latent_cache.get_or_compute(
+            entry.model, entry.model_id, str(entry.files["reference"]), cache_dir=str(entry.latent_dir)
+        )
+        return batched_inference(
+            entry.model, texts, language, gpt_cond_latent, speaker_embedding,
+            max_batch_size=TTS_BATCH_MAX_SIZE, **dict(params)
+        )
+
+
+batch_scheduler = XttsBatchScheduler(
+    _synthesize_batch,
+    inference_executor,
+    workers=TTS_INFERENCE_WORKERS,
+    max_batch_size=TTS_BATCH_MAX_SIZE,
+    max_wait_ms=TTS_BATCH_MAX_WAIT_MS,
+)
+
+
+def _lookup_cached(name, text, language, seed, params):
+    entry = xtts_manager.get(name)
+    latent_key = latent_cache.key_for_model(entry.model, entry.model_id, str(entry.files["reference"]))
+    key = synthesis_cache.key(entry.model_id, latent_key, text, language, params, seed)
+    return key, synthesis_cache.get(key)
+
+
+async def synthesize_async(name, text, language="en", seed=None, **params):
+    """Returns (wav, cache_status), cache_status is "hit", "miss" or "bypass"."""
+    cache_key = None
+    if is_deterministic(params.get("top_k"), seed):
+        cache_key, wav = await asyncio.to_thread(_lookup_cached, name, text, language, seed, params)
+        if wav is not None:
+            return wav, "hit"
+
+    if seed is None and TTS_BATCH_MAX_SIZE > 1:
+        # Requests can only share a batch when model, language and sampling settings match
+        key = (name, language, tuple(sorted(params.items())))
+        wav = await asyncio.wrap_future(batch_scheduler.submit(key, text))
+    else:
+        # Seeded requests run alone, batch rows would share the random stream.
+        # Run on the inference pool so the event loop never waits on the model
+        loop = asyncio.get_running_loop()
+        wav = await loop.run_in_executor(inference_executor, partial(synthesize, name, text, language=language, seed=seed, **params))
+
+    if cache_key is None:
+        return wav, "bypass"
+    await asyncio.to_thread(synthesis_cache.put, cache_key, wav)
+    return wav, "miss"
+
+
+def stream_synthesize(name, text, on_chunk, cancel_event, language="en", temperature=0.75, length_penalty=1.0, repetition_penalty=5.0, top_k=50, top_p=0.85, enable_text_splitting=True, seed=None, stream_chunk_size=20):
+    """Blocking streaming synthesis.
+
+    Calls `on_chunk(wav_chunk)` for every chunk XTTS produces; `on_chunk` may block
+    to apply backpressure. Stops early once `cancel_event` is set. Returns the
+    number of chunks delivered.
+    """
+    entry = xtts_manager.get(name)
+    model = entry.model
+    delivered = 0
+    with entry.lock, random_state.use(seed):
+        gpt_cond_latent, speaker_embedding = latent_cache.get_or_compute(
+            model, entry.model_id, str(entry.files["reference"]), cache_dir=str(entry.latent_dir)
+        )
+        for part in _split_text(model, text, language, enable_text_splitting):
+            chunks = model.inference_stream(
+                part,
+                language,
+                gpt_cond_latent,
+                speaker_embedding,
+                stream_chunk_size=stream_chunk_size,
+                temperature=temperature,
+                length_penalty=length_penalty,
+                repetition_penalty=float(repetition_penalty),
+                top_k=top_k,
+                top_p=top_p,
+                enable_text_splitting=False,
+            )
+            try:
+                for chunk in chunks:
+                    if cancel_event.is_set():
+                        break
+                    on_chunk(chunk.cpu().numpy() if torch.is_tensor(chunk) else chunk)
+                    delivered += 1
+            finally:
+                # Release the generator (and the GPU memory it holds) while still owning the model
+                chunks.close()
+            if cancel_event.is_set():
+                break
+    return delivered
+
+
+def wav_to_pcm16(wav):
+    return (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def wav_to_bytes(wav, sample_rate=OUTPUT_SAMPLE_RATE):
+    buffer = io.BytesIO()
+    soundfile.write(buffer, wav, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
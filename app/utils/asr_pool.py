@@ -0,0 +1,149 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import psutil
+import torch
+from faster_whisper import WhisperModel
+
+
+# Max number of Whisper models kept in memory at the same time (per process)
+ASR_MAX_MODELS = int(os.getenv("ASR_MAX_MODELS", "1"))
+# Number of CTranslate2 workers per model, allows concurrent transcribe() calls
+ASR_NUM_WORKERS = int(os.getenv("ASR_NUM_WORKERS", "1"))
+# Batch size for faster-whisper's batched pipeline (when available)
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE", "8"))
+
+
+def default_device_and_compute_type():
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    compute_type = "float16" if device == "cuda" else "float32"
+    return device, compute_type
+
+
+def _process_rss():
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+class WhisperModelPool:
+    """Process-wide registry of loaded Whisper models.
+
+    Models are keyed by (model size, device, compute_type), loaded lazily on
+    first use and shared by every caller. When more than `max_models` are
+    resident the least recently used one is dropped.
+    """
+
+    def __init__(self, max_models=ASR_MAX_MODELS, num_workers=ASR_NUM_WORKERS):
+        self.max_models = max(1, max_models)
+        self.num_workers = max(1, num_workers)
+        self._models = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.evictions = 0
+
+    def get(self, model_size="large-v3", device=None, compute_type=None):
+        if device is None:
+            device, default_compute_type = default_device_and_compute_type()
+            compute_type = compute_type or default_compute_type
+        elif compute_type is None:
+            compute_type = "float16" if device.startswith("cuda") else "float32"
+        key = (model_size, device, compute_type)
+
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self._stats[key]["hits"] += 1
+                    self._stats[key]["last_used"] = time.time()
+                    return self._models[key]
+
+                # Another request is already loading this model, wait for it
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            model, load_seconds, memory_bytes = self._load(key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+        with self._lock:
+            self._models[key] = model
+            self._stats[key] = {
+                "load_seconds": round(load_seconds, 3),
+                "memory_bytes": memory_bytes,
+                "loaded_at": time.time(),
+                "last_used": time.time(),
+                "hits": 0,
+            }
+            self._evict_locked()
+        return model
+
+    def _load(self, key):
+        model_size, device, compute_type = key
+        print(f" > Loading Whisper model {model_size} ({device}, {compute_type})")
+        rss_before = _process_rss()
+        start = time.perf_counter()
+        # "cuda:1" -> device "cuda", device_index 1
+        device_type, _, device_index = device.partition(":")
+        model = WhisperModel(
+            model_size, device=device_type, device_index=int(device_index or 0), compute_type=compute_type, num_workers=self.num_workers
+        )
+        load_seconds = time.perf_counter() - start
+        memory_bytes = max(_process_rss() - rss_before, 0)
+        return model, load_seconds, memory_bytes
+
+    def _evict_locked(self):
+        evicted = False
+        while len(self._models) > self.max_models:
+            key, _ = self._models.popitem(last=False)
+            self._stats.pop(key, None)
+            self.evictions += 1
+            evicted = True
+            print(f" > Evicted Whisper model {key[0]} ({key[1]}, {key[2]})")
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self):
+        with self._lock:
+            models = [
+                {
+                    "model_size": key[0],
+                    "device": key[1],
+                    "compute_type": key[2],
+                    **self._stats[key],
+                }
+                for key in self._models
+            ]
+        return {
+            "max_models": self.max_models,
+            "num_workers": self.num_workers,
+            "resident": len(models),
+            "evictions": self.evictions,
+            "process_rss_bytes": _process_rss(),
+            "models": models,
+        }
+
+
+whisper_pool = WhisperModelPool()
+
+
+def get_whisper_model(model_size="large-v3", device=None, compute_type=None):
+    return whisper_pool.get(model_size, device=device, compute_type=compute_type)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+TTS_AUDIO_CACHE_DIR = os.getenv("TTS_AUDIO_CACHE_DIR", "audio_cache")
+# Disk tier, least recently used files are deleted past this size
+TTS_AUDIO_CACHE_MAX_MB = int(os.getenv("TTS_AUDIO_CACHE_MAX_MB", "512"))
+# In-memory tier for the hottest prompts
+TTS_AUDIO_CACHE_MEMORY_MB = int(os.getenv("TTS_AUDIO_CACHE_MEMORY_MB", "64"))
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def is_deterministic(top_k, seed=None):
+    # XTTS always samples: the output only repeats with a pinned seed or when top_k=1
+    # leaves a single candidate per step
+    return seed is not None or top_k == 1
+
+
+class SynthesisCache:
+    """Content-addressed cache of synthesized waveforms.
+
+    Keys hash everything the output depends on (checkpoint, speaker latents,
+    normalized text, language, sampling settings, seed). Waveforms are stored
+    as float32 .npy files in `cache_dir`, evicted least recently used first
+    (file mtime, so the order survives restarts) once they take more than
+    `max_disk_bytes`, with the most recent ones also kept in memory.
+    """
+
+    def __init__(self, cache_dir=TTS_AUDIO_CACHE_DIR, max_disk_bytes=TTS_AUDIO_CACHE_MAX_MB * 1024 * 1024, max_memory_bytes=TTS_AUDIO_CACHE_MEMORY_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # key -> file size, oldest first; read from the directory on first use
+        self._disk = None
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, model_id, latent_key, text, language, params, seed=None):
+        parts = [model_id, latent_key, normalize_text(text), language, sorted(params.items()), seed]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _load_index_locked(self):
+        if self._disk is not None:
+            return
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".npy"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(".npy")], stat.st_size))
+        self._disk = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+
+    def get(self, key):
+        """Return the cached waveform for `key` (read-only numpy array) or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            self._load_index_locked()
+            on_disk = key in self._disk
+
+        if on_disk:
+            path = self._path(key)
+            try:
+                wav = np.load(path)
+                os.utime(path)
+            except (OSError, ValueError) as e:
+                print(f" > Ignoring unreadable audio cache file {path}: {e}")
+                with self._lock:
+                    self._drop_disk_locked(key)
+            else:
+                wav.flags.writeable = False
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._remember_locked(key, wav)
+                return wav
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, wav):
+        wav = np.array(wav, dtype=np.float32)
+        wav.flags.writeable = False
+        path = self._path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, wav)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._load_index_locked()
+            self._disk_bytes += size - self._disk.get(key, 0)
+            self._disk[key] = size
+            self._disk.move_to_end(key)
+            self._remember_locked(key, wav)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                oldest = next(iter(self._disk))
+                self._drop_disk_locked(oldest)
+                self.evictions += 1
+
+    def _drop_disk_locked(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key).nbytes
+
+    def _remember_locked(self, key, wav):
+        if wav.nbytes > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key).nbytes
+        self._memory[key] = wav
+        self._memory_bytes += wav.nbytes
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def stats(self):
+        with self._lock:
+            self._load_index_locked()
+            return {
+                "cache_dir": os.path.abspath(self.cache_dir),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+synthesis_cache = SynthesisCache()
@@ -0,0 +1,63 @@
+import soundfile
+import torch
+import torchaudio
+
+
+class AudioStreamReader:
+    """Seek-based mono reader over an audio file.
+
+    Only the requested frames are decoded, so memory depends on the size of the
+    reads and not on the length of the file. Formats libsndfile can't open fall
+    back to a full torchaudio decode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._wav = None
+        try:
+            self._file = soundfile.SoundFile(path)
+            self.sample_rate = self._file.samplerate
+            self.frames = self._file.frames
+        except RuntimeError:
+            wav, self.sample_rate = torchaudio.load(path)
+            self._wav = torch.mean(wav, dim=0) if wav.size(0) != 1 else wav.squeeze(0)
+            self.frames = self._wav.size(-1)
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def read(self, start_frame, num_frames):
+        """Return frames [start_frame, start_frame + num_frames) as a 1-D float32 tensor."""
+        start_frame = max(int(start_frame), 0)
+        num_frames = max(min(int(num_frames), self.frames - start_frame), 0)
+        if self._wav is not None:
+            return self._wav[start_frame:start_frame + num_frames]
+
+        self._file.seek(start_frame)
+        data = self._file.read(num_frames, dtype="float32", always_2d=True)
+        wav = torch.from_numpy(data)
+        if wav.size(1) != 1:
+            wav = torch.mean(wav, dim=1)
+        else:
+            wav = wav.squeeze(1)
+        return wav
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._wav = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def resample_for_asr(wav, sample_rate, asr_sample_rate=16000):
+    if sample_rate != asr_sample_rate:
+        wav = torchaudio.functional.resample(wav, sample_rate, asr_sample_rate)
+    return wav.numpy()
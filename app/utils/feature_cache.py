@@ -0,0 +1,378 @@
+import hashlib
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import torchaudio
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from TTS.tts.layers.xtts.trainer.dataset import XTTSDataset
+from TTS.tts.layers.xtts.trainer.gpt_trainer import GPTTrainer
+from TTS.tts.models.xtts import load_audio
+
+
+# Clips per shard; a shard is written once and never modified
+FEATURE_CACHE_SHARD_CLIPS = int(os.getenv("FEATURE_CACHE_SHARD_CLIPS", "512"))
+FEATURE_CACHE_LOAD_WORKERS = int(os.getenv("FEATURE_CACHE_LOAD_WORKERS", "4"))
+
+
+def _file_sha1(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def feature_key(model):
+    """Identifies everything the cached features depend on: mel stats, DVAE weights and audio settings."""
+    args, audio = model.args, model.config.audio
+    style_mel = model.torch_mel_spectrogram_style_encoder
+    parts = [
+        _file_sha1(args.mel_norm_file) if args.mel_norm_file else None,
+        _file_sha1(args.dvae_checkpoint) if args.dvae_checkpoint else None,
+        audio.sample_rate,
+        audio.dvae_sample_rate,
+        style_mel.hop_length,
+        style_mel.n_mel_channels,
+    ]
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()[:16]
+
+
+@torch.no_grad()
+def _dvae_codes(model, wav):
+    # Same steps as GPTTrainer.format_batch_on_device, for a single unpadded clip
+    audio = model.config.audio
+    if audio.sample_rate != audio.dvae_sample_rate:
+        wav = torchaudio.functional.resample(
+            wav,
+            orig_freq=audio.sample_rate,
+            new_freq=audio.dvae_sample_rate,
+            lowpass_filter_width=64,
+            rolloff=0.9475937167399596,
+            resampling_method="kaiser_window",
+            beta=14.769656459379492,
+        )
+    return model.dvae.get_codebook_indices(model.torch_mel_spectrogram_dvae(wav))[0]
+
+
+class FeatureCache:
+    """DVAE codes and conditioning mels of training clips, keyed by audio sha1.
+
+    Lives in `<root>/<feature key>/`: `index.json` maps a clip hash to its shard
+    and slices, and every shard is a pair of .npy files, all its clips' codes
+    (int16) and all their style encoder mel frames ([frames, n_mel] float32)
+    back to back, opened memory-mapped.
+    """
+
+    def __init__(self, root, key):
+        self.dir = os.path.join(root, key)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.index = {"shards": 0, "silence": None, "clips": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                self.index = json.load(index_file)
+        self._shards = {}
+
+    def __contains__(self, audio_sha1):
+        return audio_sha1 in self.index["clips"]
+
+    def __len__(self):
+        return len(self.index["clips"])
+
+    @property
+    def silence(self):
+        # Mel frame of digital silence, used to pad conditioning slices
+        return torch.tensor(self.index["silence"], dtype=torch.float32)
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            prefix = os.path.join(self.dir, f"shard_{shard:05d}")
+            self._shards[shard] = (
+                np.load(f"{prefix}.codes.npy", mmap_mode="r"),
+                np.load(f"{prefix}.mels.npy", mmap_mode="r"),
+            )
+        return self._shards[shard]
+
+    def get(self, audio_sha1):
+        """(codes LongTensor [T_codes], mel FloatTensor [n_mel, T_mel], wav length in samples) or None."""
+        entry = self.index["clips"].get(audio_sha1)
+        if entry is None:
+            return None
+        shard, code_start, code_len, mel_start, mel_len, wav_len = entry
+        codes, mels = self._shard(shard)
+        return (
+            torch.from_numpy(codes[code_start:code_start + code_len].astype(np.int64)),
+            torch.from_numpy(np.array(mels[mel_start:mel_start + mel_len]).T),
+            wav_len,
+        )
+
+    def add_shard(self, clips):
+        """Store [(audio_sha1, codes, mel [n_mel, T], wav_len)] as a new shard and update the index."""
+        os.makedirs(self.dir, exist_ok=True)
+        shard = self.index["shards"]
+        prefix = os.path.join(self.dir, f"shard_{shard:05d}")
+        codes = np.concatenate([c.cpu().numpy().astype(np.int16) for _, c, _, _ in clips])
+        mels = np.concatenate([m.cpu().numpy().T.astype(np.float32) for _, _, m, _ in clips])
+        for suffix, array in (("codes", codes), ("mels", mels)):
+            tmp_path = f"{prefix}.{suffix}.npy.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, f"{prefix}.{suffix}.npy")
+
+        code_start = mel_start = 0
+        for audio_sha1, c, m, wav_len in clips:
+            self.index["clips"][audio_sha1] = [shard, code_start, len(c), mel_start, m.shape[-1], wav_len]
+            code_start += len(c)
+            mel_start += m.shape[-1]
+        self.index["shards"] = shard + 1
+        self._save_index()
+
+    def _save_index(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.index, index_file)
+        os.replace(tmp_path, self.index_path)
+
+
+def build_feature_cache(model, samples, root, load_workers=FEATURE_CACHE_LOAD_WORKERS, shard_clips=FEATURE_CACHE_SHARD_CLIPS, device=None):
+    """One pass over `samples` that stores the features of clips not cached yet.
+
+    Clips are read and hashed by `load_workers` threads while the model
+    computes codes and mels; every sample gets an "audio_sha1" key used by
+    CachedFeatureDataset. The DVAE and mel modules run on `device`, the GPU
+    when there is one by default, and are moved back afterwards: the cache is
+    built before the trainer places the model. Returns the FeatureCache.
+    """
+    device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    feature_modules = [model.dvae, model.torch_mel_spectrogram_dvae, model.torch_mel_spectrogram_style_encoder]
+    model_device = model.device
+    for module in feature_modules:
+        module.to(device)
+    try:
+        return _build_feature_cache(model, samples, root, load_workers, shard_clips, device)
+    finally:
+        for module in feature_modules:
+            module.to(model_device)
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+
+
+def _build_feature_cache(model, samples, root, load_workers, shard_clips, device):
+    cache = FeatureCache(root, feature_key(model))
+    sample_rate = model.config.audio.sample_rate
+
+    if cache.index["silence"] is None:
+        hop = model.torch_mel_spectrogram_style_encoder.hop_length
+        with torch.no_grad():
+            mel = model.torch_mel_spectrogram_style_encoder(torch.zeros(1, 1, hop * 8, device=device))
+        cache.index["silence"] = mel[0, :, mel.shape[-1] // 2].cpu().tolist()
+
+    def load(sample):
+        try:
+            audio_sha1 = _file_sha1(sample["audio_file"])
+            if audio_sha1 in cache:
+                return audio_sha1, None
+            return audio_sha1, load_audio(sample["audio_file"], sample_rate)
+        except Exception as e:
+            # The dataset then skips the sample like any clip that fails to load
+            print(f" > Skipping {sample['audio_file']} in the feature cache: {e}")
+            return None, None
+
+    pending = []
+    queued = set()
+    in_flight = deque()
+    remaining = iter(samples)
+    with ThreadPoolExecutor(max_workers=max(1, load_workers), thread_name_prefix="feature-load") as pool:
+
+        def submit_next():
+            sample = next(remaining, None)
+            if sample is None:
+                return False
+            in_flight.append((sample, pool.submit(load, sample)))
+            return True
+
+        # A few clips decoded ahead of the model, without holding the whole dataset in memory
+        for _ in range(2 * max(1, load_workers)):
+            if not submit_next():
+                break
+
+        with tqdm(total=len(samples), desc="Caching features") as progress:
+            while in_flight:
+                sample, future = in_flight.popleft()
+                audio_sha1, wav = future.result()
+                submit_next()
+                progress.update()
+                sample["audio_sha1"] = audio_sha1
+                if wav is None or audio_sha1 in queued:
+                    continue
+                with torch.no_grad():
+                    wav = wav.to(device).unsqueeze(0)
+                    codes = _dvae_codes(model, wav)
+                    mel = model.torch_mel_spectrogram_style_encoder(wav)[0]
+                # Off the GPU right away, a shard holds up to shard_clips clips
+                pending.append((audio_sha1, codes.cpu(), mel.cpu(), wav.shape[-1]))
+                queued.add(audio_sha1)
+                if len(pending) >= shard_clips:
+                    cache.add_shard(pending)
+                    pending = []
+    if pending:
+        cache.add_shard(pending)
+    cache._save_index()
+    return cache
+
+
+class CachedFeatureDataset(XTTSDataset):
+    """XTTSDataset that reads DVAE codes and conditioning mels from a FeatureCache.
+
+    The conditioning prompt is drawn like get_prompt_slice (random length and
+    start, the middle length from the start for eval) but cut from the clip's
+    cached mel, with the start on a mel frame, and padded with silence frames
+    to the length of `max_conditioning_length` samples.
+    """
+
+    def __init__(self, config, samples, tokenizer, sample_rate, is_eval=False, feature_cache=None, hop_length=256):
+        self.feature_cache = feature_cache
+        self.hop_length = hop_length
+        super().__init__(config, samples, tokenizer, sample_rate, is_eval)
+
+    def check_eval_samples(self):
+        self.samples = [sample for sample in self.samples if self._valid(sample)]
+
+    def _valid(self, sample):
+        try:
+            return self.load_item(sample) is not None
+        except Exception:
+            return False
+
+    def load_item(self, sample):
+        text = str(sample["text"])
+        if len(text.strip()) == 0:
+            raise ValueError
+        tseq = self.get_text(text, sample["language"])
+        cached = self.feature_cache.get(sample.get("audio_sha1"))
+        if cached is None:
+            raise ValueError
+        codes, mel, wav_len = cached
+        if wav_len < 0.5 * self.sample_rate or wav_len > self.max_wav_len or tseq.shape[0] > self.max_text_len:
+            # Ultra short or out of range, like the checks in XTTSDataset
+            return None
+
+        if self.is_eval:
+            sample_length = int((self.min_conditioning_length + self.max_conditioning_length) / 2)
+        else:
+            sample_length = random.randint(self.min_conditioning_length, self.max_conditioning_length)
+        if wav_len - sample_length < 0:
+            sample_length = wav_len // 2
+        start_frame = 0 if self.is_eval else random.randint(0, wav_len - sample_length) // self.hop_length
+        frames = sample_length // self.hop_length + 1
+        total_frames = self.max_conditioning_length // self.hop_length + 1
+        cond = mel[:, start_frame:start_frame + frames]
+        cond = torch.cat([cond, self.feature_cache.silence[:, None].expand(-1, total_frames - cond.shape[-1])], dim=1)
+        start = start_frame * self.hop_length
+        return tseq, sample["audio_file"], codes, wav_len, cond, [start, start + sample_length]
+
+    def __getitem__(self, index):
+        if self.is_eval:
+            sample = self.samples[index]
+            sample_id = str(index)
+        else:
+            lang = random.choice(list(self.samples.keys()))
+            index = random.randint(0, len(self.samples[lang]) - 1)
+            sample = self.samples[lang][index]
+            sample_id = lang + "_" + str(index)
+
+        if sample_id in self.failed_samples:
+            return self[1]
+        try:
+            item = self.cached_item(sample)
+        except Exception:
+            item = None
+        if item is None:
+            self.failed_samples.add(sample_id)
+            return self[1]
+        return item
+
+    def cached_item(self, sample):
+        """The training item of `sample`, None when it is out of range."""
+        item = self.load_item(sample)
+        if item is None:
+            return None
+        tseq, audiopath, codes, wav_len, cond, cond_idxs = item
+        return {
+            "text": tseq,
+            "text_lengths": torch.tensor(tseq.shape[0], dtype=torch.long),
+            "audio_codes": codes,
+            "wav_lengths": torch.tensor(wav_len, dtype=torch.long),
+            "filenames": audiopath,
+            "cond_mels": cond.unsqueeze(0),
+            # The masking prompt approach does not use cond_lens
+            "cond_lens": torch.tensor([torch.nan]),
+            "cond_idxs": torch.tensor(cond_idxs),
+        }
+
+    def collate_fn(self, batch):
+        batch = {k: [dic[k] for dic in batch] for k in batch[0]}
+        batch["text_lengths"] = torch.stack(batch["text_lengths"])
+        batch["wav_lengths"] = torch.stack(batch["wav_lengths"])
+        batch["cond_mels"] = torch.stack(batch["cond_mels"])
+        batch["cond_idxs"] = torch.stack(batch["cond_idxs"])
+        batch["cond_lens"] = None
+
+        max_text_len = int(batch["text_lengths"].max())
+        batch["padded_text"] = torch.stack([F.pad(text, (0, max_text_len - text.shape[0])) for text in batch.pop("text")])
+        # The GPT replaces codes past each clip's length with the stop token
+        max_codes = max(codes.shape[0] for codes in batch["audio_codes"])
+        batch["audio_codes"] = torch.stack([F.pad(codes, (0, max_codes - codes.shape[0])) for codes in batch["audio_codes"]])
+        return batch
+
+
+class CachedFeatureGPTTrainer(GPTTrainer):
+    """GPTTrainer that trains from a FeatureCache when `feature_cache` is set.
+
+    Only the masking prompt approach (gpt_use_masking_gt_prompt_approach) is
+    supported, which is what train_gpt uses.
+    """
+
+    feature_cache = None
+
+    def get_data_loader(self, config, assets, is_eval, samples, verbose, num_gpus, rank=None):
+        if self.feature_cache is None or (is_eval and not config.run_eval):
+            return super().get_data_loader(config, assets, is_eval, samples, verbose, num_gpus, rank)
+
+        dataset = CachedFeatureDataset(
+            self.config,
+            samples,
+            self.xtts.tokenizer,
+            config.audio.sample_rate,
+            is_eval,
+            feature_cache=self.feature_cache,
+            hop_length=self.torch_mel_spectrogram_style_encoder.hop_length,
+        )
+        if num_gpus > 1:
+            torch.distributed.barrier()
+        sampler = None if is_eval else self.get_sampler(dataset, num_gpus)
+        return DataLoader(
+            dataset,
+            sampler=sampler,
+            batch_size=config.eval_batch_size if is_eval else config.batch_size,
+            shuffle=False,
+            drop_last=False,
+            collate_fn=dataset.collate_fn,
+            num_workers=config.num_eval_loader_workers if is_eval else config.num_loader_workers,
+            pin_memory=False,
+        )
+
+    @torch.no_grad()
+    def format_batch_on_device(self, batch):
+        if "audio_codes" not in batch:
+            return super().format_batch_on_device(batch)
+        batch["text_inputs"] = batch.pop("padded_text")
+        return batch
@@ -1,26 +1,44 @@
 import os
 import gc
+import csv
+import hashlib
+import json
 import torchaudio
 import pandas
+import soundfile
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from faster_whisper import WhisperModel
-from glob import glob
+from glob import glob, escape as glob_escape
+
+try:
+    # Only available in newer faster-whisper releases
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:
+    BatchedInferencePipeline = None
 
 from tqdm import tqdm
 
+from .audio_stream import AudioStreamReader, resample_for_asr
+
 from TTS.tts.layers.xtts.tokenizer import multilingual_cleaners
 # Add support for JA train
 # from utils.tokenizer import multilingual_cleaners
 
 import torch
 import torchaudio
-# torch.set_num_threads(1)
-
-
-torch.set_num_threads(16)
+# No torch.set_num_threads() here: it applies to the whole process, the thread
+# counts of the dataset jobs come from app/core/resources.py
 import os
 
 audio_types = (".wav", ".mp3", ".flac")
 
+# Whisper expects 16 kHz mono input
+ASR_SAMPLE_RATE = 16000
+# Longest stretch of audio decoded at once, bounds memory on long recordings
+ASR_WINDOW_SECONDS = 300
+
 def find_latest_best_model(folder_path):
         search_path = os.path.join(folder_path, '**', 'best_model.pth')
         files = glob(search_path, recursive=True)
@@ -51,148 +69,457 @@ def list_files(basePath, validExts=None, contains=None):
                 audioPath = os.path.join(rootDir, filename)
                 yield audioPath
 
-def format_audio_list(audio_files, asr_model, target_language="en", out_path=None, buffer=0.2, eval_percentage=0.15, speaker_name="coqui", gradio_progress=None):
-    audio_total_size = 0
-    os.makedirs(out_path, exist_ok=True)
+def load_audio(audio_path, window_seconds=ASR_WINDOW_SECONDS, asr_sample_rate=ASR_SAMPLE_RATE):
+    # Open the source and decode its first window (the whole file for short clips)
+    reader = AudioStreamReader(audio_path)
+    wav = reader.read(0, int(window_seconds * reader.sample_rate))
+    return reader, wav, resample_for_asr(wav, reader.sample_rate, asr_sample_rate)
 
-    lang_file_path = os.path.join(out_path, "lang.txt")
-    current_language = None
-    if os.path.exists(lang_file_path):
-        with open(lang_file_path, 'r', encoding='utf-8') as existing_lang_file:
-            current_language = existing_lang_file.read().strip()
 
-    if current_language != target_language:
-        with open(lang_file_path, 'w', encoding='utf-8') as lang_file:
-            lang_file.write(target_language + '\n')
-        print("Warning, existing language does not match target language. Updated lang.txt with target language.")
+def transcribe_words(asr_model, audio, target_language="en", batch_size=1, offset=0.0):
+    if batch_size > 1 and BatchedInferencePipeline is not None:
+        pipeline = BatchedInferencePipeline(model=asr_model)
+        segments, _ = pipeline.transcribe(audio, vad_filter=True, word_timestamps=True, language=target_language, batch_size=batch_size)
     else:
-        print("Existing language matches target language")
+        segments, _ = asr_model.transcribe(audio, vad_filter=True, word_timestamps=True, language=target_language)
 
-    metadata = {"audio_file": [], "text": [], "speaker_name": []}
-    train_metadata_path = os.path.join(out_path, "metadata_train.csv")
-    eval_metadata_path = os.path.join(out_path, "metadata_eval.csv")
+    words_list = []
+    for segment in segments:
+        for word in segment.words:
+            # Timestamps relative to the start of the source file
+            words_list.append(SimpleNamespace(start=word.start + offset, end=word.end + offset, word=word.word))
+    return words_list
 
-    existing_metadata = {'train': None, 'eval': None}
-    if os.path.exists(train_metadata_path):
-        existing_metadata['train'] = pandas.read_csv(train_metadata_path, sep="|")
-        print("Existing training metadata found and loaded.")
 
-    if os.path.exists(eval_metadata_path):
-        existing_metadata['eval'] = pandas.read_csv(eval_metadata_path, sep="|")
-        print("Existing evaluation metadata found and loaded.")
+def _is_sentence_end(word):
+    return word.word[-1] in ["!", "。", ".", "?"]
 
-    if gradio_progress is not None:
-        tqdm_object = gradio_progress.tqdm(audio_files, desc="Formatting...")
-    else:
-        tqdm_object = tqdm(audio_files)
 
-    for audio_path in tqdm_object:
-        audio_file_name_without_ext, _= os.path.splitext(os.path.basename(audio_path))
-        prefix_check = f"wavs/{audio_file_name_without_ext}_"
+def sentence_spans(words_list, buffer=0.2, previous_word_end=None, audio_end=None):
+    """Yield (sentence, start, end) in seconds for every sentence closed in `words_list`.
 
-        skip_processing = False
-        for key in ['train', 'eval']:
-            if existing_metadata[key] is not None:
-                mask = existing_metadata[key]['audio_file'].str.startswith(prefix_check)
-                if mask.any():
-                    print(f"Segments from {audio_file_name_without_ext} have been previously processed; skipping...")
-                    skip_processing = True
-                    break
+    `previous_word_end` is the end of the word right before `words_list` (None at the
+    start of the file) and `audio_end` the time used after the last word.
+    """
+    sentence = ""
+    sentence_start = None
+    first_word = True
 
-        if skip_processing:
-            continue
+    for word_idx, word in enumerate(words_list):
+        if first_word:
+            sentence_start = word.start
+            if word_idx > 0:
+                previous_word_end = words_list[word_idx - 1].end
+            if previous_word_end is None:
+                sentence_start = max(sentence_start - buffer, 0)
+            else:
+                sentence_start = max(sentence_start - buffer, (previous_word_end + sentence_start) / 2)
 
-        wav, sr = torchaudio.load(audio_path)
-        if wav.size(0) != 1:
-            wav = torch.mean(wav, dim=0, keepdim=True)
-
-        wav = wav.squeeze()
-        audio_total_size += (wav.size(-1) / sr)
-
-        segments, _= asr_model.transcribe(audio_path, vad_filter=True, word_timestamps=True, language=target_language)
-        segments = list(segments)
-        i = 0
-        sentence = ""
-        sentence_start = None
-        first_word = True
-        words_list = []
-        for _, segment in enumerate(segments):
-            words = list(segment.words)
-            words_list.extend(words)
-
-        for word_idx, word in enumerate(words_list):
-            if first_word:
-                sentence_start = word.start
-                if word_idx == 0:
-                    sentence_start = max(sentence_start - buffer, 0)
-                else:
-                    previous_word_end = words_list[word_idx - 1].end
-                    sentence_start = max(sentence_start - buffer, (previous_word_end + sentence_start) / 2)
+            sentence = word.word
+            first_word = False
+        else:
+            sentence += word.word
 
-                sentence = word.word
-                first_word = False
+        if _is_sentence_end(word):
+            if word_idx + 1 < len(words_list):
+                next_word_start = words_list[word_idx + 1].start
             else:
-                sentence += word.word
+                next_word_start = audio_end
 
-            if word.word[-1] in ["!", "。", ".", "?"]:
-                sentence = sentence[1:]
-                sentence = multilingual_cleaners(sentence, target_language)
-                audio_file_name, _= os.path.splitext(os.path.basename(audio_path))
-                audio_file = f"wavs/{audio_file_name}_{str(i).zfill(8)}.wav"
+            word_end = min((word.end + next_word_start) / 2, word.end + buffer)
+            first_word = True
+
+            yield sentence[1:], sentence_start, word_end
+
+
+def process_audio_file(audio_path, decoded, asr_model, target_language="en", out_path=None, buffer=0.2, speaker_name="coqui", batch_size=1, window_seconds=ASR_WINDOW_SECONDS):
+    """Transcribe one source file window by window and save its sentence clips.
 
-                if word_idx + 1 < len(words_list):
-                    next_word_start = words_list[word_idx + 1].start
+    Each window is decoded once and shared by Whisper (resampled copy) and the clip
+    slicing. Words after the last sentence end of a window are transcribed again as
+    the start of the next one, so sentences never straddle two windows and memory
+    stays bounded by `window_seconds` whatever the length of the file.
+    """
+    # `decoded` is either the output of load_audio or a future resolving to it
+    reader, wav, asr_audio = decoded.result() if hasattr(decoded, "result") else decoded
+    audio_file_name, _ = os.path.splitext(os.path.basename(audio_path))
+    rows = []
+    i = 0
+
+    with reader:
+        sr = reader.sample_rate
+        window_frames = int(window_seconds * sr)
+        window_start = 0
+        previous_word_end = None
+
+        while True:
+            window_end = window_start + wav.size(-1)
+            is_last = window_end >= reader.frames
+
+            words_list = transcribe_words(asr_model, asr_audio, target_language, batch_size=batch_size, offset=window_start / sr)
+            del asr_audio
+
+            if is_last:
+                audio_end = (reader.frames - 1) / sr
+                next_window_start = window_end
+            else:
+                last_end = max((idx for idx, word in enumerate(words_list) if _is_sentence_end(word)), default=None)
+                if last_end is None:
+                    # No sentence closes in this window
+                    audio_end = None
+                    words_list = []
+                    next_window_start = window_end
                 else:
-                    next_word_start = (wav.shape[0] - 1) / sr
+                    tail = words_list[last_end + 1:]
+                    words_list = words_list[:last_end + 1]
+                    audio_end = tail[0].start if tail else window_end / sr
+                    # Resume between the last kept word and the next one
+                    next_window_start = max(int(sr * (words_list[-1].end + audio_end) / 2), window_start + 1)
 
-                word_end = min((word.end + next_word_start) / 2, word.end + buffer)
+            for sentence, sentence_start, word_end in sentence_spans(words_list, buffer=buffer, previous_word_end=previous_word_end, audio_end=audio_end):
+                sentence = multilingual_cleaners(sentence, target_language)
+                audio_file = f"wavs/{audio_file_name}_{str(i).zfill(8)}.wav"
 
                 absolute_path = os.path.join(out_path, audio_file)
                 os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
                 i += 1
-                first_word = True
 
-                audio = wav[int(sr*sentence_start):int(sr *word_end)].unsqueeze(0)
+                start_frame, end_frame = int(sr*sentence_start), int(sr *word_end)
+                if window_start <= start_frame and end_frame <= window_end:
+                    audio = wav[start_frame - window_start:end_frame - window_start]
+                else:
+                    # The buffer before the first word reaches into the previous window
+                    audio = reader.read(start_frame, end_frame - start_frame)
+
+                audio = audio.unsqueeze(0)
                 if audio.size(-1) >= sr / 3:
                     torchaudio.save(absolute_path, audio, sr)
                 else:
                     continue
 
-                metadata["audio_file"].append(audio_file)
-                metadata["text"].append(sentence)
-                metadata["speaker_name"].append(speaker_name)
+                rows.append((audio_file, sentence, speaker_name, round(audio.size(-1) / sr, 3)))
+
+            if is_last:
+                break
+
+            if words_list:
+                previous_word_end = words_list[-1].end
+            window_start = next_window_start
+            wav = reader.read(window_start, window_frames)
+            asr_audio = resample_for_asr(wav, sr)
+
+        return rows, reader.frames / sr
+
+
+def _iter_processed_audio(audio_files, num_workers=1, window_seconds=ASR_WINDOW_SECONDS, **kwargs):
+    """Yield (audio_path, rows, duration) in input order.
 
-                df = pandas.DataFrame(metadata)
+    With num_workers > 1 files are decoded and resampled in a separate pool while up
+    to `num_workers` transcriptions run concurrently (the Whisper model needs to be
+    created with num_workers > 1 for the transcriptions to really overlap).
+    """
+    if num_workers <= 1:
+        for audio_path in audio_files:
+            rows, duration = process_audio_file(audio_path, load_audio(audio_path, window_seconds), window_seconds=window_seconds, **kwargs)
+            yield audio_path, rows, duration
+        return
 
-                mode = 'w' if not os.path.exists(train_metadata_path) else 'a'
-                header = not os.path.exists(train_metadata_path)
-                df.to_csv(train_metadata_path, sep="|", index=False, mode=mode, header=header)
+    in_flight = deque()
+    files = iter(audio_files)
+    with ThreadPoolExecutor(num_workers, thread_name_prefix="decode") as decoders, \
+            ThreadPoolExecutor(num_workers, thread_name_prefix="asr") as transcribers:
 
-                mode = 'w' if not os.path.exists(eval_metadata_path) else 'a'
-                header = not os.path.exists(eval_metadata_path)
-                df.to_csv(eval_metadata_path, sep="|", index=False, mode=mode, header=header)
+        def submit_next():
+            audio_path = next(files, None)
+            if audio_path is None:
+                return False
+            decoded = decoders.submit(load_audio, audio_path, window_seconds)
+            in_flight.append((audio_path, transcribers.submit(process_audio_file, audio_path, decoded, window_seconds=window_seconds, **kwargs)))
+            return True
+
+        # Keep one extra file decoded per worker so ASR never waits on decoding
+        for _ in range(2 * num_workers):
+            if not submit_next():
+                break
+
+        try:
+            while in_flight:
+                audio_path, future = in_flight.popleft()
+                rows, duration = future.result()
+                submit_next()
+                yield audio_path, rows, duration
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+
+# duration (seconds) lets the trainer batch clips by length without opening them
+METADATA_COLUMNS = ["audio_file", "text", "speaker_name", "duration"]
+METADATA_LOG_FILE = "metadata_log.csv"
+
+
+class MetadataAccumulator:
+    """Keeps the metadata rows of a run in memory and appends them to a log in batches.
+
+    The log is what makes an interrupted run resumable: each flush is fsync'ed and
+    contains whole source files only, and it is removed once the final train/eval
+    split has been written.
+    """
+
+    def __init__(self, log_path, flush_every=256):
+        self.log_path = log_path
+        self.flush_every = flush_every
+        self.rows = []
+        self._pending = []
+
+    def add(self, rows):
+        self.rows.extend(rows)
+        self._pending.extend(rows)
+
+    def maybe_flush(self):
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if not self._pending:
+            return
+        with open(self.log_path, "a", encoding="utf-8", newline="") as log_file:
+            csv.writer(log_file, delimiter="|").writerows(self._pending)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self._pending = []
+
+    def to_dataframe(self):
+        return pandas.DataFrame(self.rows, columns=METADATA_COLUMNS)
+
+    def remove_log(self):
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    @staticmethod
+    def read_log(log_path):
+        return pandas.read_csv(log_path, sep="|", header=None, names=METADATA_COLUMNS)
+
+
+SOURCE_INDEX_FILE = "processed_sources.json"
+
+
+def _file_sha1(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _source_stems(df, unique=True):
+    # "wavs/<source stem>_<8 digit index>.wav" -> "<source stem>"
+    stems = df["audio_file"].str.slice(len("wavs/")).str.rsplit("_", n=1).str[0]
+    return set(stems.dropna()) if unique else stems
+
+
+class ProcessedSourceIndex:
+    """Persisted record of the source files already turned into clips.
+
+    Entries are keyed by source file stem (the prefix of the generated clip names)
+    and store size, mtime and sha1, so the resume check is a dict lookup and a
+    stat(); the file is only hashed again when size or mtime differ.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.exists = os.path.exists(path)
+        self.entries = {}
+        if self.exists:
+            with open(path, "r", encoding="utf-8") as index_file:
+                self.entries = json.load(index_file)
+
+    def add_legacy(self, stems):
+        # Sources known from the metadata only, without a fingerprint to compare with
+        for stem in stems:
+            self.entries.setdefault(stem, {"size": None, "mtime": None, "sha1": None, "segments": None})
+
+    def status(self, audio_path):
+        stem, _ = os.path.splitext(os.path.basename(audio_path))
+        entry = self.entries.get(stem)
+        if entry is None:
+            return "new"
+        if entry["sha1"] is None:
+            return "unchanged"
+
+        stat = os.stat(audio_path)
+        if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+            return "unchanged"
+        if stat.st_size == entry["size"] and _file_sha1(audio_path) == entry["sha1"]:
+            # Touched but identical content
+            entry["mtime"] = stat.st_mtime
+            return "unchanged"
+        return "changed"
+
+    def mark(self, audio_path, segments):
+        stem, _ = os.path.splitext(os.path.basename(audio_path))
+        stat = os.stat(audio_path)
+        self.entries[stem] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha1": _file_sha1(audio_path),
+            "segments": segments,
+        }
+
+    def discard(self, stem):
+        self.entries.pop(stem, None)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.entries, index_file, indent=1)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+
+def _fill_durations(df, out_path):
+    # Rows written before the duration column existed
+    if "duration" not in df:
+        df["duration"] = float("nan")
+    missing = df["duration"].isna()
+    if missing.any():
+        df.loc[missing, "duration"] = [
+            round(soundfile.info(os.path.join(out_path, audio_file)).duration, 3)
+            for audio_file in df.loc[missing, "audio_file"]
+        ]
+    return df
+
+
+def _write_csv_atomic(df, path):
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, sep="|", index=False)
+    os.replace(tmp_path, path)
+
+
+def format_audio_list(audio_files, asr_model, target_language="en", out_path=None, buffer=0.2, eval_percentage=0.15, speaker_name="coqui", gradio_progress=None, progress_callback=None, num_workers=1, batch_size=1, flush_every=256, window_seconds=ASR_WINDOW_SECONDS):
+    audio_total_size = 0
+    os.makedirs(out_path, exist_ok=True)
 
-                metadata = {"audio_file": [], "text": [], "speaker_name": []}
+    lang_file_path = os.path.join(out_path, "lang.txt")
+    current_language = None
+    if os.path.exists(lang_file_path):
+        with open(lang_file_path, 'r', encoding='utf-8') as existing_lang_file:
+            current_language = existing_lang_file.read().strip()
 
-    if os.path.exists(train_metadata_path) and os.path.exists(eval_metadata_path):
-        existing_train_df = existing_metadata['train']
-        existing_eval_df = existing_metadata['eval']
+    if current_language != target_language:
+        with open(lang_file_path, 'w', encoding='utf-8') as lang_file:
+            lang_file.write(target_language + '\n')
+        print("Warning, existing language does not match target language. Updated lang.txt with target language.")
     else:
-        existing_train_df = pandas.DataFrame(columns=["audio_file", "text", "speaker_name"])
-        existing_eval_df = pandas.DataFrame(columns=["audio_file", "text", "speaker_name"])
+        print("Existing language matches target language")
 
-    new_data_df = pandas.read_csv(train_metadata_path, sep="|")
+    train_metadata_path = os.path.join(out_path, "metadata_train.csv")
+    eval_metadata_path = os.path.join(out_path, "metadata_eval.csv")
+    log_metadata_path = os.path.join(out_path, METADATA_LOG_FILE)
 
-    combined_train_df = pandas.concat([existing_train_df, new_data_df], ignore_index=True).drop_duplicates().reset_index(drop=True)
-    combined_eval_df = pandas.concat([existing_eval_df, new_data_df], ignore_index=True).drop_duplicates().reset_index(drop=True)
+    existing_metadata = {'train': None, 'eval': None, 'log': None}
+    if os.path.exists(train_metadata_path):
+        existing_metadata['train'] = pandas.read_csv(train_metadata_path, sep="|")
+        print("Existing training metadata found and loaded.")
+
+    if os.path.exists(eval_metadata_path):
+        existing_metadata['eval'] = pandas.read_csv(eval_metadata_path, sep="|")
+        print("Existing evaluation metadata found and loaded.")
 
-    combined_train_df_shuffled = combined_train_df.sample(frac=1)
-    num_val_samples = int(len(combined_train_df_shuffled)* eval_percentage)
+    if os.path.exists(log_metadata_path):
+        # Rows of an interrupted run that never reached the final split
+        existing_metadata['log'] = MetadataAccumulator.read_log(log_metadata_path)
+        print("Metadata of an interrupted run found and loaded.")
+
+    source_index = ProcessedSourceIndex(os.path.join(out_path, SOURCE_INDEX_FILE))
+    if all(df is None for df in existing_metadata.values()):
+        # The metadata was removed, nothing can be skipped
+        source_index.entries = {}
+    elif not source_index.exists:
+        # Datasets formatted before the index existed: rebuild it from the metadata once
+        for key in ['train', 'eval']:
+            if existing_metadata[key] is not None:
+                source_index.add_legacy(_source_stems(existing_metadata[key]))
+    if existing_metadata['log'] is not None:
+        source_index.add_legacy(_source_stems(existing_metadata['log']))
 
-    final_eval_set = combined_train_df_shuffled[:num_val_samples]
-    final_training_set = combined_train_df_shuffled[num_val_samples:]
+    pending_files = []
+    changed_stems = set()
+    for audio_path in audio_files:
+        audio_file_name_without_ext, _= os.path.splitext(os.path.basename(audio_path))
 
-    final_training_set.sort_values('audio_file').to_csv(train_metadata_path, sep='|', index=False)
-    final_eval_set.sort_values('audio_file').to_csv(eval_metadata_path, sep='|', index=False)
+        status = source_index.status(audio_path)
+        if status == "unchanged":
+            print(f"Segments from {audio_file_name_without_ext} have been previously processed; skipping...")
+            continue
+        if status == "changed":
+            print(f"{audio_file_name_without_ext} changed since it was processed; reprocessing...")
+            changed_stems.add(audio_file_name_without_ext)
+        pending_files.append(audio_path)
+
+    if changed_stems:
+        # Drop the rows and clips of the old version of the changed sources
+        for key in existing_metadata:
+            if existing_metadata[key] is not None:
+                df = existing_metadata[key]
+                existing_metadata[key] = df[~_source_stems(df, unique=False).isin(changed_stems)]
+        for stem in changed_stems:
+            for old_clip in glob(os.path.join(out_path, "wavs", f"{glob_escape(stem)}_*.wav")):
+                os.remove(old_clip)
+            source_index.discard(stem)
+
+    processed = _iter_processed_audio(
+        pending_files,
+        num_workers=num_workers,
+        asr_model=asr_model,
+        target_language=target_language,
+        out_path=out_path,
+        buffer=buffer,
+        speaker_name=speaker_name,
+        batch_size=batch_size,
+        window_seconds=window_seconds,
+    )
+    if gradio_progress is not None:
+        tqdm_object = gradio_progress.tqdm(processed, desc="Formatting...", total=len(pending_files))
+    else:
+        tqdm_object = tqdm(processed, total=len(pending_files))
+
+    if progress_callback is not None:
+        # progress_callback(done, total) may raise to abort (e.g. job cancelled)
+        progress_callback(0, len(pending_files))
+
+    accumulator = MetadataAccumulator(log_metadata_path, flush_every=flush_every)
+    for file_idx, (audio_path, rows, duration) in enumerate(tqdm_object):
+        audio_total_size += duration
+
+        # Flushes only happen between source files so the log never holds a partial file
+        accumulator.add(rows)
+        source_index.mark(audio_path, len(rows))
+        if accumulator.maybe_flush():
+            source_index.save()
+
+        if progress_callback is not None:
+            progress_callback(file_idx + 1, len(pending_files))
+    accumulator.flush()
+    source_index.save()
+
+    # Split everything once: previous train/eval rows, rows of an interrupted run and the new ones
+    combined_df = pandas.concat(
+        [df for df in existing_metadata.values() if df is not None] + [accumulator.to_dataframe()],
+        ignore_index=True
+    )
+    combined_df = _fill_durations(combined_df, out_path).drop_duplicates().reset_index(drop=True)
+
+    combined_df_shuffled = combined_df.sample(frac=1)
+    num_val_samples = int(len(combined_df_shuffled)* eval_percentage)
+
+    final_eval_set = combined_df_shuffled[:num_val_samples]
+    final_training_set = combined_df_shuffled[num_val_samples:]
+
+    _write_csv_atomic(final_training_set.sort_values('audio_file'), train_metadata_path)
+    _write_csv_atomic(final_eval_set.sort_values('audio_file'), eval_metadata_path)
+    accumulator.remove_log()
 
     return train_metadata_path, eval_metadata_path, audio_total_size
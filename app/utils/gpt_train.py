@@ -3,7 +3,7 @@ import os
 import gc
 from pathlib import Path
 
-from trainer import Trainer, TrainerArgs
+from trainer import TrainerArgs
 
 from TTS.config.shared_configs import BaseDatasetConfig
 from TTS.tts.datasets import load_tts_samples
@@ -11,8 +11,24 @@ from TTS.tts.layers.xtts.trainer.gpt_trainer import GPTArgs, GPTTrainer, GPTTrai
 from TTS.utils.manage import ModelManager
 import shutil
 
+from .feature_cache import build_feature_cache
+from .length_bucketing import BucketedGPTTrainer, read_durations
+from .resumable_trainer import ResumableTrainer, find_resume_run
+from .token_sidecar import PrecomputedTokenizer, build_token_sidecar
+from .tokenizer import VoiceBpeTokenizer
 
-def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm, train_csv, eval_csv, output_path, max_audio_length=255995):
+# Precompute DVAE codes and conditioning mels once instead of every step, see feature_cache.py
+TRAIN_FEATURE_CACHE = os.getenv("TRAIN_FEATURE_CACHE", "0") == "1"
+# Padded audio frames per training batch, 0 keeps fixed size batches; see length_bucketing.py.
+# TRAIN_BATCH_FRAMES=-1 uses batch_size * max_audio_length, the most a fixed size batch can pad to
+TRAIN_BATCH_FRAMES = int(os.getenv("TRAIN_BATCH_FRAMES", "-1"))
+# Data loader processes, the job runner passes its share of the cores instead
+TRAIN_LOADER_WORKERS = int(os.getenv("TRAIN_LOADER_WORKERS", "8"))
+# Steps between checkpoints, the most a hard kill can lose (SIGTERM saves one right away)
+TRAIN_SAVE_STEP = int(os.getenv("TRAIN_SAVE_STEP", "1000"))
+
+
+def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm, train_csv, eval_csv, output_path, max_audio_length=255995, use_feature_cache=TRAIN_FEATURE_CACHE, batch_frames=TRAIN_BATCH_FRAMES, callbacks=None, resume=False, num_loader_workers=None, stop_event=None):
     #  Logging parameters
     RUN_NAME = "GPT_XTTS_FT"
     PROJECT_NAME = "XTTS_trainer"
@@ -111,7 +127,7 @@ def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm
         else:
             print(" > Error: The specified custom model is not a valid .pth file path.")
 
-    num_workers = 8
+    num_workers = TRAIN_LOADER_WORKERS if num_loader_workers is None else num_loader_workers
     if language == "ja":
         num_workers = 0
     # init args and config
@@ -154,7 +170,7 @@ def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm
         print_step=50,
         plot_step=100,
         log_model_step=100,
-        save_step=1000,
+        save_step=TRAIN_SAVE_STEP,
         save_n_checkpoints=1,
         save_checkpoints=True,
         # target_loss="loss",
@@ -171,7 +187,22 @@ def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm
     )
 
     # init the model from config
-    model = GPTTrainer.init_from_config(config)
+    if use_feature_cache or batch_frames:
+        model = BucketedGPTTrainer(config)
+    else:
+        model = GPTTrainer.init_from_config(config)
+    if batch_frames:
+        # Batches by total audio length, using the durations format_audio_list recorded
+        model.clip_durations = read_durations(train_csv)
+        model.max_batch_frames = batch_frames if batch_frames > 0 else BATCH_SIZE * max_audio_length
+        # Every sample also carries a fixed size conditioning clip
+        model.max_batch_size = 2 * BATCH_SIZE
+
+    # Tokenize the metadata once (reused until the CSV or vocab changes) so the
+    # data loaders read ids instead of running the cleaners and BPE every epoch
+    tokenizer = VoiceBpeTokenizer(TOKENIZER_FILE)
+    sidecars = [build_token_sidecar(csv_path, TOKENIZER_FILE, language, tokenizer=tokenizer) for csv_path in (train_csv, eval_csv)]
+    model.xtts.tokenizer = PrecomputedTokenizer(tokenizer, sidecars)
 
     # load training samples
     train_samples, eval_samples = load_tts_samples(
@@ -180,11 +211,22 @@ def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm
         eval_split_max_size=config.eval_split_max_size,
         eval_split_size=config.eval_split_size,
     )
+    if use_feature_cache:
+        feature_cache_dir = os.path.join(os.path.dirname(train_csv), "feature_cache")
+        model.feature_cache = build_feature_cache(model, train_samples + eval_samples, feature_cache_dir)
+
+    # Continue the latest run under OUT_PATH: model, optimizer, scheduler and sampler position
+    continue_path = find_resume_run(OUT_PATH) if resume else None
+    if continue_path:
+        print(f" > Resuming training from {continue_path}")
+    elif resume:
+        print(" > No checkpoint to resume from, starting a new run")
 
     # init the trainer and 🚀
-    trainer = Trainer(
+    trainer = ResumableTrainer(
         TrainerArgs(
             restore_path=None,  # xtts checkpoint is restored via xtts_checkpoint key so no need of restore it using Trainer restore_path parameter
+            continue_path=continue_path or "",
             skip_train_epoch=False,
             start_with_eval=START_WITH_EVAL,
             grad_accum_steps=GRAD_ACUMM_STEPS,
@@ -194,6 +236,9 @@ def train_gpt(custom_model,version, language, num_epochs, batch_size, grad_acumm
         model=model,
         train_samples=train_samples,
         eval_samples=eval_samples,
+        callbacks=callbacks,
+        # Set to stop with a checkpoint, like SIGTERM
+        stop_event=stop_event,
     )
     trainer.fit()
 
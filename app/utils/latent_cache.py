@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+
+def model_id_for_checkpoint(checkpoint_path):
+    # Changes whenever the checkpoint is replaced (retraining, optimization)
+    path, size, mtime = _fingerprint(checkpoint_path)
+    return f"{path}:{size}:{mtime}"
+
+
+class ConditioningLatentCache:
+    """Caches XTTS `get_conditioning_latents` results.
+
+    Keyed by (model id, reference audio hash, gpt_cond_len, max_ref_len,
+    sound_norm_refs). Entries live in an in-memory LRU and, when a `cache_dir`
+    is given, are also saved there so they survive restarts.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._reference_hashes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _reference_hash(self, reference_path):
+        fingerprint = _fingerprint(reference_path)
+        with self._lock:
+            cached = self._reference_hashes.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        sha1 = hashlib.sha1()
+        with open(reference_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        with self._lock:
+            self._reference_hashes[fingerprint] = sha1.hexdigest()
+        return sha1.hexdigest()
+
+    def key(self, model_id, reference_path, gpt_cond_len, max_ref_len, sound_norm_refs):
+        parts = [model_id, self._reference_hash(reference_path), gpt_cond_len, max_ref_len, bool(sound_norm_refs)]
+        return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def key_for_model(self, model, model_id, reference_path):
+        config = model.config
+        return self.key(model_id, reference_path, config.gpt_cond_len, config.max_ref_len, config.sound_norm_refs)
+
+    def get_or_compute(self, model, model_id, reference_path, cache_dir=None):
+        """Return (gpt_cond_latent, speaker_embedding) for `reference_path`."""
+        gpt_cond_len = model.config.gpt_cond_len
+        max_ref_len = model.config.max_ref_len
+        sound_norm_refs = model.config.sound_norm_refs
+        key = self.key_for_model(model, model_id, reference_path)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        disk_path = os.path.join(cache_dir, f"{key}.pth") if cache_dir else None
+        latents = None
+        if disk_path and os.path.exists(disk_path):
+            try:
+                saved = torch.load(disk_path, map_location=model.device)
+                latents = (saved["gpt_cond_latent"], saved["speaker_embedding"])
+                self.disk_hits += 1
+            except Exception as e:
+                print(f" > Ignoring unreadable latent cache file {disk_path}: {e}")
+
+        if latents is None:
+            self.misses += 1
+            latents = model.get_conditioning_latents(
+                audio_path=reference_path,
+                gpt_cond_len=gpt_cond_len,
+                max_ref_length=max_ref_len,
+                sound_norm_refs=sound_norm_refs,
+            )
+            if disk_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = disk_path + ".tmp"
+                torch.save({"gpt_cond_latent": latents[0].cpu(), "speaker_embedding": latents[1].cpu()}, tmp_path)
+                os.replace(tmp_path, disk_path)
+
+        with self._lock:
+            self._entries[key] = latents
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return latents
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+latent_cache = ConditioningLatentCache()
@@ -0,0 +1,214 @@
+import csv
+import os
+import random
+
+import soundfile
+import torch
+from torch.utils.data import DataLoader, Sampler
+
+from TTS.tts.layers.xtts.trainer.dataset import XTTSDataset
+
+from .feature_cache import CachedFeatureDataset, CachedFeatureGPTTrainer
+
+
+# Batches are cut from pools of this many batches sorted by length, so the
+# order stays random while clips of a batch have similar durations
+BUCKET_POOL_BATCHES = int(os.getenv("BUCKET_POOL_BATCHES", "50"))
+
+
+def read_durations(csv_path):
+    """{absolute clip path: seconds} from the duration column written by format_audio_list."""
+    root = os.path.dirname(csv_path)
+    durations = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter="|"):
+            if row.get("duration"):
+                durations[os.path.join(root, row["audio_file"])] = float(row["duration"])
+    return durations
+
+
+def sample_frames(samples, durations, sample_rate):
+    """Length of every sample in frames at `sample_rate`; clips missing from `durations` are measured."""
+    frames = []
+    for sample in samples:
+        duration = durations.get(sample["audio_file"])
+        if duration is None:
+            duration = soundfile.info(sample["audio_file"]).duration
+        frames.append(int(duration * sample_rate))
+    return frames
+
+
+def padded_frames(batches, lengths):
+    """Frames a padded batch holds, summed over `batches`: len(batch) * longest clip."""
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+class DurationBucketBatchSampler(Sampler):
+    """Batches of similar length clips bounded by padded audio frames instead of a count.
+
+    A batch holds as many clips as fit in `max_frames` once padded to its
+    longest one (and at most `max_batch_size`), so batches of short clips are
+    larger and none needs more memory than `max_frames` allows. Every epoch
+    the indices are shuffled, sorted by length within pools of
+    `pool_batches` batches and the resulting batches shuffled again.
+    """
+
+    def __init__(self, lengths, max_frames, max_batch_size=None, pool_batches=BUCKET_POOL_BATCHES, shuffle=True, seed=0):
+        self.lengths = lengths
+        self.max_frames = max_frames
+        self.max_batch_size = max_batch_size
+        self.pool_batches = pool_batches
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self._skip = 0
+        self._plan = None
+        # Clips longer than the budget could never be batched
+        self.indices = [i for i, length in enumerate(lengths) if 0 < length <= max_frames]
+
+    def _batches(self, epoch):
+        rng = random.Random(self.seed + epoch)
+        indices = list(self.indices)
+        if self.shuffle:
+            rng.shuffle(indices)
+        mean_length = max(1, sum(self.lengths[i] for i in indices) // max(1, len(indices)))
+        pool_size = max(1, self.pool_batches * self.max_frames // mean_length)
+
+        batches = []
+        for start in range(0, len(indices), pool_size):
+            pool = sorted(indices[start:start + pool_size], key=lambda i: self.lengths[i])
+            batch, longest = [], 0
+            for i in pool:
+                longest_with_i = max(longest, self.lengths[i])
+                full = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+                if batch and (full or longest_with_i * (len(batch) + 1) > self.max_frames):
+                    batches.append(batch)
+                    batch, longest_with_i = [], self.lengths[i]
+                batch.append(i)
+                longest = longest_with_i
+            if batch:
+                batches.append(batch)
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def _planned(self):
+        if self._plan is None or self._plan[0] != self.epoch:
+            self._plan = (self.epoch, self._batches(self.epoch))
+        return self._plan[1]
+
+    def resume(self, epoch, batches_done):
+        """Continue an interrupted run: the next iteration is `epoch` without its first `batches_done` batches."""
+        self.epoch = epoch
+        self._skip = batches_done
+
+    def __iter__(self):
+        yield from self._planned()[self._skip:]
+        # Only once the epoch is done, so len() during it matches what is iterated
+        self._skip = 0
+        self.epoch += 1
+
+    def __len__(self):
+        return max(len(self._planned()) - self._skip, 0)
+
+
+class _IndexedTrainingItems:
+    # XTTSDataset picks a random sample whatever the index while training;
+    # with a batch sampler the index has to be honoured
+
+    def flatten_samples(self):
+        self.flat_samples = [sample for samples in self.samples.values() for sample in samples]
+
+    def __getitem__(self, index):
+        if self.is_eval:
+            return super().__getitem__(index)
+        item = self.indexed_item(self.flat_samples[index])
+        if item is None:
+            # Same fallback as XTTSDataset for samples that fail to load
+            return super().__getitem__(index)
+        return item
+
+
+class BucketedXTTSDataset(_IndexedTrainingItems, XTTSDataset):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_eval:
+            self.flatten_samples()
+
+    def indexed_item(self, sample):
+        try:
+            tseq, audiopath, wav, cond, cond_len, cond_idxs = self.load_item(sample)
+        except Exception:
+            return None
+        if wav is None or wav.shape[-1] > self.max_wav_len or tseq.shape[0] > self.max_text_len:
+            return None
+        return {
+            "text": tseq,
+            "text_lengths": torch.tensor(tseq.shape[0], dtype=torch.long),
+            "wav": wav,
+            "wav_lengths": torch.tensor(wav.shape[-1], dtype=torch.long),
+            "filenames": audiopath,
+            "conditioning": cond.unsqueeze(1),
+            "cond_lens": (
+                torch.tensor(cond_len, dtype=torch.long) if cond_len is not torch.nan else torch.tensor([cond_len])
+            ),
+            "cond_idxs": torch.tensor(cond_idxs) if cond_idxs is not torch.nan else torch.tensor([cond_idxs]),
+        }
+
+
+class BucketedCachedFeatureDataset(_IndexedTrainingItems, CachedFeatureDataset):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_eval:
+            self.flatten_samples()
+
+    def indexed_item(self, sample):
+        try:
+            return self.cached_item(sample)
+        except Exception:
+            return None
+
+
+class BucketedGPTTrainer(CachedFeatureGPTTrainer):
+    """GPTTrainer whose training batches come from a DurationBucketBatchSampler.
+
+    Set `clip_durations` ({clip path: seconds}) and `max_batch_frames` to
+    enable it; evaluation and multi-GPU runs keep the stock loaders. Works
+    with or without the feature cache.
+    """
+
+    clip_durations = None
+    max_batch_frames = None
+    max_batch_size = None
+
+    def get_data_loader(self, config, assets, is_eval, samples, verbose, num_gpus, rank=None):
+        if is_eval or num_gpus > 1 or not self.max_batch_frames or self.clip_durations is None:
+            return super().get_data_loader(config, assets, is_eval, samples, verbose, num_gpus, rank)
+
+        if self.feature_cache is not None:
+            dataset = BucketedCachedFeatureDataset(
+                self.config,
+                samples,
+                self.xtts.tokenizer,
+                config.audio.sample_rate,
+                is_eval,
+                feature_cache=self.feature_cache,
+                hop_length=self.torch_mel_spectrogram_style_encoder.hop_length,
+            )
+        else:
+            dataset = BucketedXTTSDataset(self.config, samples, self.xtts.tokenizer, config.audio.sample_rate, is_eval)
+
+        lengths = sample_frames(dataset.flat_samples, self.clip_durations, config.audio.sample_rate)
+        # Clips the dataset would reject anyway are left out of the batches
+        min_length = 0.5 * config.audio.sample_rate
+        lengths = [length if min_length <= length <= dataset.max_wav_len else 0 for length in lengths]
+        batch_sampler = DurationBucketBatchSampler(
+            lengths, self.max_batch_frames, max_batch_size=self.max_batch_size, seed=config.training_seed
+        )
+        return DataLoader(
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=dataset.collate_fn,
+            num_workers=config.num_loader_workers,
+            pin_memory=False,
+        )
@@ -0,0 +1,60 @@
+from safetensors.torch import load_file
+from transformers.modeling_utils import no_init_weights
+from TTS.tts.models.xtts import Xtts
+
+from .model_export import IGNORED_MODEL_KEYS
+
+
+def is_mapped_checkpoint(path):
+    return str(path).endswith(".safetensors")
+
+
+class MappedXtts(Xtts):
+    """Xtts that also loads .safetensors checkpoints, memory-mapped.
+
+    The mapped tensors become the model's weights (load_state_dict with
+    `assign`) instead of being copied into newly allocated ones, so nothing is
+    unpickled or duplicated: a CPU model is backed by the page cache, pages are
+    read when first used and every process serving the model on the host
+    shares them. Weights stored in another dtype than the model's (an fp16 or
+    bf16 export) are cast, those are private copies. .pth checkpoints load
+    like with Xtts.
+
+    The networks are built without initializing their weights, which the
+    checkpoint overwrites anyway: a MappedXtts is meant to be loaded with
+    load_checkpoint() before use.
+    """
+
+    _assign_weights = False
+
+    def __init__(self, config):
+        with no_init_weights():
+            super().__init__(config)
+
+    def load_checkpoint(self, config, checkpoint_dir=None, checkpoint_path=None, strict=True, **kwargs):
+        self._assign_weights = is_mapped_checkpoint(checkpoint_path)
+        try:
+            # load_checkpoint() builds the networks again, strict loading overwrites every weight
+            with no_init_weights(_enable=strict):
+                return super().load_checkpoint(config, checkpoint_dir=checkpoint_dir, checkpoint_path=checkpoint_path, strict=strict, **kwargs)
+        finally:
+            self._assign_weights = False
+
+    def get_compatible_checkpoint_state_dict(self, model_path):
+        if not is_mapped_checkpoint(model_path):
+            return super().get_compatible_checkpoint_state_dict(model_path)
+
+        # Same key conversion as Xtts, on tensors that still point into the file
+        model_state = self.state_dict()
+        checkpoint = {}
+        for key, tensor in load_file(model_path, device="cpu").items():
+            key = key[len("xtts."):] if key.startswith("xtts.") else key
+            if key.split(".")[0] in IGNORED_MODEL_KEYS:
+                continue
+            if key in model_state and model_state[key].dtype != tensor.dtype:
+                tensor = tensor.to(model_state[key].dtype)
+            checkpoint[key] = tensor
+        return checkpoint
+
+    def load_state_dict(self, state_dict, strict=True, assign=False):
+        return super().load_state_dict(state_dict, strict=strict, assign=assign or self._assign_weights)
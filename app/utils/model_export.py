@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+
+import torch
+
+
+# State dict entries Xtts.load_checkpoint drops anyway (first key component, after "xtts.")
+IGNORED_MODEL_KEYS = ("torch_mel_spectrogram_style_encoder", "torch_mel_spectrogram_dvae", "dvae")
+# Trainer checkpoint entries only needed to continue training
+TRAINING_STATE_KEYS = ("optimizer", "scaler")
+
+EXPORT_DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
+# Optimized model file in a ready/ folder for each export format, loaded before unoptimize_model.pth
+OPTIMIZED_MODEL_FILES = {"safetensors": "model.safetensors", "pth": "model.pth"}
+
+_SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+
+
+def load_checkpoint_lazy(path):
+    """torch.load with the tensors memory-mapped: nothing is read until a tensor is used.
+
+    Falls back to a regular load for checkpoints in the legacy (non zip) format.
+    """
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=False)
+    except RuntimeError:
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def inference_state_dict(model_state):
+    """The entries of a fine-tuned XTTS state dict inference needs, without the DVAE and mel front-ends."""
+    kept = {}
+    for key, tensor in model_state.items():
+        name = key[len("xtts."):] if key.startswith("xtts.") else key
+        if name.split(".")[0] not in IGNORED_MODEL_KEYS:
+            kept[key] = tensor
+    return kept
+
+
+def _cast(tensor, dtype):
+    if dtype is not None and tensor.is_floating_point():
+        return tensor.to(dtype)
+    return tensor
+
+
+def save_safetensors(state_dict, path, metadata=None, dtype=None):
+    """Writes `state_dict` in the safetensors format one tensor at a time.
+
+    safetensors.torch.save_file serializes the whole file in memory first, here
+    only the tensor being written (cast to `dtype` when given) is.
+    """
+    header = {}
+    offset = 0
+    for key, tensor in state_dict.items():
+        tensor_dtype = dtype if dtype is not None and tensor.is_floating_point() else tensor.dtype
+        nbytes = tensor.numel() * torch.empty((), dtype=tensor_dtype).element_size()
+        header[key] = {"dtype": _SAFETENSORS_DTYPES[tensor_dtype], "shape": list(tensor.shape), "data_offsets": [offset, offset + nbytes]}
+        offset += nbytes
+    if metadata:
+        header["__metadata__"] = {key: str(value) for key, value in metadata.items()}
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # The data starts 8 byte aligned
+    header_bytes += b" " * (-len(header_bytes) % 8)
+    with open(path, "wb") as f:
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for tensor in state_dict.values():
+            data = _cast(tensor, dtype).contiguous().reshape(-1)
+            f.write(data.view(torch.uint8).numpy())
+
+
+def export_checkpoint(src, dst, dtype=None, fmt=None):
+    """Copies what inference needs from the training checkpoint `src` into `dst`.
+
+    The optimizer and scaler state and the DVAE weights are left out without
+    ever being read: the source is memory-mapped and only the kept tensors are
+    copied. `dtype` ("fp16" / "bf16") down-casts the floating point weights,
+    Xtts.load_checkpoint casts them back to the model's dtype. `fmt` is "pth"
+    or "safetensors", from the extension of `dst` by default. Returns the
+    number of bytes written.
+    """
+    if dtype is not None and dtype not in EXPORT_DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {', '.join(EXPORT_DTYPES)}")
+    fmt = fmt or ("safetensors" if str(dst).endswith(".safetensors") else "pth")
+    torch_dtype = EXPORT_DTYPES.get(dtype)
+
+    checkpoint = load_checkpoint_lazy(src)
+    state_dict = inference_state_dict(checkpoint["model"])
+
+    # Written next to dst and renamed, a failed export never leaves a truncated model behind
+    tmp_path = f"{dst}.tmp"
+    try:
+        if fmt == "safetensors":
+            metadata = {key: checkpoint[key] for key in ("step", "epoch", "date") if key in checkpoint}
+            save_safetensors(state_dict, tmp_path, {"format": "pt", **metadata}, dtype=torch_dtype)
+        elif fmt == "pth":
+            exported = {key: value for key, value in checkpoint.items() if key not in TRAINING_STATE_KEYS and key != "model"}
+            exported["model"] = {key: _cast(tensor, torch_dtype) for key, tensor in state_dict.items()}
+            torch.save(exported, tmp_path)
+        else:
+            raise ValueError(f"Unsupported format '{fmt}', expected pth or safetensors")
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(dst)
+
+
+def export_ready_model(ready_dir, dtype=None, fmt="pth"):
+    """Exports ready/unoptimize_model.pth to the optimized model file of `fmt` and removes the source.
+
+    An optimized model of the other format is removed too, it would be loaded
+    instead of the new one. Returns the path of the exported model.
+    """
+    source = os.path.join(ready_dir, "unoptimize_model.pth")
+    optimized = os.path.join(ready_dir, OPTIMIZED_MODEL_FILES[fmt])
+    export_checkpoint(source, optimized, dtype=dtype, fmt=fmt)
+    for name in OPTIMIZED_MODEL_FILES.values():
+        stale = os.path.join(ready_dir, name)
+        if stale != optimized and os.path.exists(stale):
+            os.remove(stale)
+    os.remove(source)
+    return optimized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a fine-tuned XTTS checkpoint for inference")
+    parser.add_argument("src", help="training checkpoint, e.g. ready/unoptimize_model.pth")
+    parser.add_argument("dst", help="output file, .pth or .safetensors")
+    parser.add_argument("--dtype", choices=sorted(EXPORT_DTYPES), help="down-cast the weights")
+    parser.add_argument("--format", choices=["pth", "safetensors"], help="from the extension of dst by default")
+    args = parser.parse_args()
+
+    size = export_checkpoint(args.src, args.dst, dtype=args.dtype, fmt=args.format)
+    print(f"Exported {args.dst} ({size / (1 << 20):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import glob
+import json
+import logging
+import os
+import signal
+import threading
+
+import torch.distributed as dist
+from trainer import Trainer
+from trainer.generic_utils import KeepAverage
+from trainer.utils.distributed import rank_zero_only
+
+logger = logging.getLogger("trainer")
+
+# Where in the epoch each of the latest checkpoints was saved, kept in the run folder
+RESUME_STATE_FILE = "resume_state.json"
+RESUME_STATE_KEEP = 8
+
+
+def find_resume_run(training_path):
+    """The run folder under `training_path` (run/training) with the newest checkpoint, or None."""
+    latest_run, latest_mtime = None, None
+    for run_dir in glob.glob(os.path.join(training_path, "*")):
+        if not os.path.isfile(os.path.join(run_dir, "config.json")):
+            continue
+        checkpoints = glob.glob(os.path.join(run_dir, "checkpoint_*.pth")) + glob.glob(os.path.join(run_dir, "best_model_*.pth"))
+        for checkpoint in checkpoints:
+            mtime = os.path.getmtime(checkpoint)
+            if latest_mtime is None or mtime > latest_mtime:
+                latest_run, latest_mtime = run_dir, mtime
+    return latest_run
+
+
+def _read_resume_state(run_dir):
+    try:
+        with open(os.path.join(run_dir, RESUME_STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ResumableTrainer(Trainer):
+    """Trainer whose runs can be continued after an interruption.
+
+    Continuing a run (`continue_path`) restores the model, optimizer, AMP
+    scaler and LR scheduler like the stock Trainer, but starts from the epoch
+    the run stopped in instead of epoch 0. When the train loader's batch
+    sampler has `resume()` (DurationBucketBatchSampler) the batches of that
+    epoch already trained on are skipped too, otherwise the epoch starts over.
+
+    SIGTERM, or setting `stop_event` (e.g. a multiprocessing.Event, which
+    also works on Windows where there is no SIGTERM to catch), saves a
+    checkpoint once the current step is done and stops the run the same way
+    Ctrl+C does.
+    """
+
+    def __init__(self, *args, stop_event=None, **kwargs):
+        self._epoch_batches = 0
+        self._stop_requested = False
+        self._stop_event = stop_event
+        super().__init__(*args, **kwargs)
+        self._resume_position = None
+        if self.args.continue_path:
+            position = _read_resume_state(self.output_path).get(str(self.restore_step - 1))
+            # Without a recorded position (e.g. a run started before) the epoch is redone
+            self._resume_position = tuple(position) if position else (self.restore_epoch, 0)
+
+    def get_train_dataloader(self, training_assets, samples, verbose):
+        loader = super().get_train_dataloader(training_assets, samples, verbose)
+        if self._resume_position is not None and hasattr(loader.batch_sampler, "resume"):
+            epoch, batches_done = self._resume_position
+            loader.batch_sampler.resume(epoch, batches_done)
+            self._epoch_batches = batches_done
+            logger.info(" > Skipping the %i batches of epoch %i trained before the interruption", batches_done, epoch)
+        return loader
+
+    def train_epoch(self):
+        # Set to the skipped batches instead when the loader is created for a resumed epoch
+        self._epoch_batches = 0
+        super().train_epoch()
+
+    def train_step(self, batch, batch_n_steps, step, loader_start_time):
+        self._epoch_batches += 1
+        outputs = super().train_step(batch, batch_n_steps, step, loader_start_time)
+        if self._stop_requested or (self._stop_event is not None and self._stop_event.is_set()):
+            logger.info(" > Stop requested, stopping after step %i", self.total_steps_done)
+            # fit() saves a checkpoint on KeyboardInterrupt (save_on_interrupt) and exits
+            raise KeyboardInterrupt()
+        return outputs
+
+    @rank_zero_only
+    def save_checkpoint(self):
+        super().save_checkpoint()
+        self._save_resume_position(self.epochs_done, self._epoch_batches)
+
+    @rank_zero_only
+    def save_best_model(self):
+        super().save_best_model()
+        # Saved once the epoch is over, including its evaluation
+        self._save_resume_position(self.epochs_done + 1, 0)
+
+    def _save_resume_position(self, epoch, batches_done):
+        # Keyed by the step stored in the checkpoint, restore_step is that + 1
+        state = _read_resume_state(self.output_path)
+        state[str(self.total_steps_done)] = [epoch, batches_done]
+        state = dict(sorted(state.items(), key=lambda item: int(item[0]))[-RESUME_STATE_KEEP:])
+        path = os.path.join(self.output_path, RESUME_STATE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def _request_stop(self, signum, frame):
+        # Only a flag: the step in progress finishes before the checkpoint is saved
+        self._stop_requested = True
+
+    def fit(self):
+        if threading.current_thread() is not threading.main_thread():
+            # Signal handlers can only be set from the main thread
+            return super().fit()
+        previous_handler = signal.signal(signal.SIGTERM, self._request_stop)
+        try:
+            return super().fit()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def _fit(self):
+        if self._resume_position is None:
+            return super()._fit()
+
+        # Trainer._fit starting at the interrupted epoch instead of 0
+        self._restore_best_loss()
+        self.total_steps_done = self.restore_step
+
+        for epoch in range(self._resume_position[0], self.config.epochs):
+            if self.num_gpus > 1:
+                dist.barrier()
+            self.callbacks.on_epoch_start(self)
+            self.keep_avg_train = KeepAverage()
+            self.keep_avg_eval = KeepAverage() if self.config.run_eval else None
+            self.epochs_done = epoch
+            self.c_logger.print_epoch_start(epoch, self.config.epochs, self.output_path)
+            if not self.skip_train_epoch and not self.start_with_eval:
+                self.train_epoch()
+            if self.config.run_eval:
+                self.eval_epoch()
+            if epoch >= self.config.test_delay_epochs and self.args.rank <= 0:
+                self.test_run()
+
+            self.c_logger.print_epoch_end(
+                epoch,
+                self.keep_avg_eval.avg_values if self.config.run_eval else self.keep_avg_train.avg_values,
+            )
+            if self.args.rank in [None, 0]:
+                self.save_best_model()
+            self.callbacks.on_epoch_end(self)
+            self.start_with_eval = False
@@ -0,0 +1,147 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .tokenizer import VoiceBpeTokenizer
+
+
+# Bump when the cleaners change in a way that changes token ids
+SIDECAR_VERSION = 1
+
+
+def _file_sha256(path, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def sidecar_paths(csv_path):
+    """metadata_train.csv -> metadata_train.tokens.npy, .offsets.npy and .tokens.json"""
+    stem, _ = os.path.splitext(csv_path)
+    return f"{stem}.tokens.npy", f"{stem}.offsets.npy", f"{stem}.tokens.json"
+
+
+def read_metadata_texts(csv_path):
+    # Same reader as the coqui formatter, so the strings match what the dataset passes to encode()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f, delimiter="|")]
+
+
+def _expected_meta(csv_path, vocab_file, language):
+    return {
+        "version": SIDECAR_VERSION,
+        "vocab_sha256": _file_sha256(vocab_file),
+        "csv_sha256": _file_sha256(csv_path),
+        "language": language.split("-")[0],
+    }
+
+
+def _save_npy_atomic(path, array):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class TokenSidecar:
+    """Token ids of every text in a metadata CSV, memory-mapped from disk.
+
+    `ids` holds all sequences back to back and `offsets[i]:offsets[i + 1]` is
+    the slice of row i.
+    """
+
+    def __init__(self, texts, ids, offsets, language):
+        self.language = language
+        self.ids = ids
+        self.offsets = offsets
+        self.rows = {text: i for i, text in enumerate(texts)}
+
+    def get(self, text):
+        row = self.rows.get(text)
+        if row is None:
+            return None
+        return self.ids[self.offsets[row]:self.offsets[row + 1]]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def load_token_sidecar(csv_path, vocab_file, language):
+    """The sidecar of `csv_path`, or None when it is missing or was built from another vocab, CSV or language."""
+    ids_path, offsets_path, meta_path = sidecar_paths(csv_path)
+    if not all(os.path.exists(path) for path in (ids_path, offsets_path, meta_path)):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as meta_file:
+        meta = json.load(meta_file)
+    if {key: meta.get(key) for key in ("version", "vocab_sha256", "csv_sha256", "language")} != _expected_meta(csv_path, vocab_file, language):
+        return None
+    texts = read_metadata_texts(csv_path)
+    offsets = np.load(offsets_path)
+    if len(offsets) != len(texts) + 1:
+        return None
+    return TokenSidecar(texts, np.load(ids_path, mmap_mode="r"), offsets, meta["language"])
+
+
+def build_token_sidecar(csv_path, vocab_file, language, tokenizer=None, num_workers=1):
+    """Tokenize every text of `csv_path` once and store the ids next to it.
+
+    An up to date sidecar is reused as is. Returns the loaded TokenSidecar.
+    """
+    sidecar = load_token_sidecar(csv_path, vocab_file, language)
+    if sidecar is not None:
+        return sidecar
+
+    tokenizer = tokenizer or VoiceBpeTokenizer(vocab_file)
+    texts = read_metadata_texts(csv_path)
+    print(f" > Tokenizing {len(texts)} texts of {os.path.basename(csv_path)}")
+    sequences = tokenizer.encode_batch(texts, language, num_workers=num_workers)
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(seq) for seq in sequences], out=offsets[1:])
+    ids = np.fromiter((token for seq in sequences for token in seq), dtype=np.int32, count=int(offsets[-1]))
+
+    ids_path, offsets_path, meta_path = sidecar_paths(csv_path)
+    _save_npy_atomic(ids_path, ids)
+    _save_npy_atomic(offsets_path, offsets)
+    # Written last, a sidecar without it is never used
+    meta = dict(_expected_meta(csv_path, vocab_file, language), texts=len(texts), tokens=int(offsets[-1]))
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file, indent=1)
+    os.replace(tmp_path, meta_path)
+    return load_token_sidecar(csv_path, vocab_file, language)
+
+
+class PrecomputedTokenizer:
+    """Tokenizer for the training datasets that serves ids from sidecars.
+
+    Texts found in a sidecar of the same language skip the cleaners and BPE;
+    anything else (and every other attribute) goes to the wrapped tokenizer.
+    """
+
+    def __init__(self, tokenizer, sidecars):
+        self._tokenizer = tokenizer
+        self._sidecars = [sidecar for sidecar in sidecars if sidecar is not None]
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, txt, lang):
+        base_lang = lang.split("-")[0]
+        for sidecar in self._sidecars:
+            if sidecar.language == base_lang:
+                ids = sidecar.get(txt)
+                if ids is not None:
+                    self.hits += 1
+                    return ids.tolist()
+        self.misses += 1
+        return self._tokenizer.encode(txt, lang)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            # Not set up yet, e.g. while unpickling in a data loader worker
+            raise AttributeError(name)
+        return getattr(self._tokenizer, name)
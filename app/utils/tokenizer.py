@@ -1,7 +1,9 @@
 import os
+import random
 import re
 import textwrap
-from functools import cached_property
+import threading
+from functools import cached_property, lru_cache
 
 import pypinyin
 import torch
@@ -18,54 +20,120 @@ from tokenizers import Tokenizer
 from TTS.tts.layers.xtts.zh_num2words import TextNorm as zh_num2words
 
 
+_SPACY_LANGS = {
+    "zh": Chinese,
+    "ja": Japanese,
+    "ar": Arabic,
+    "es": Spanish,
+}
+
+
 def get_spacy_lang(lang):
-    if lang == "zh":
-        return Chinese()
-    elif lang == "ja":
-        return Japanese()
-    elif lang == "ar":
-        return Arabic()
-    elif lang == "es":
-        return Spanish()
-    else:
-        # For most languages, Enlish does the job
-        return English()
+    # For most languages, Enlish does the job
+    return _SPACY_LANGS.get(lang, English)()
+
+
+# spaCy interns every token string it sees in the pipeline's vocab, on a server splitting
+# arbitrary text that never stops growing: a pipeline is rebuilt past this many strings
+SENTENCIZER_MAX_STRINGS = int(os.getenv("SENTENCIZER_MAX_STRINGS", "200000"))
+
+
+class _Sentencizer:
+    def __init__(self, language_class):
+        self.language_class = language_class
+        self.nlp = None
+        # spaCy pipelines are not documented as thread-safe (the vocab is mutated while
+        # tokenizing, ja/zh wrap third party tokenizers) and this one is shared by the
+        # inference threads: one split at a time per language
+        self.lock = threading.Lock()
+
+    def split(self, texts):
+        with self.lock:
+            if self.nlp is None or len(self.nlp.vocab.strings) > SENTENCIZER_MAX_STRINGS:
+                self.nlp = self.language_class()
+                self.nlp.add_pipe("sentencizer")
+            return [[sent.text for sent in doc.sents] for doc in self.nlp.pipe(texts)]
+
+
+_sentencizers = {}
+_sentencizers_lock = threading.Lock()
+
+
+def sentencize(texts, lang):
+    """The sentences of each of `texts`, from a shared spaCy sentencizer pipeline for `lang`.
+
+    Languages without their own spaCy class share the English pipeline.
+    """
+    language_class = _SPACY_LANGS.get(lang, English)
+    with _sentencizers_lock:
+        sentencizer = _sentencizers.get(language_class)
+        if sentencizer is None:
+            sentencizer = _sentencizers[language_class] = _Sentencizer(language_class)
+    return sentencizer.split(texts)
+
+
+def _pack_sentences(sentences, text_split_length):
+    text_splits = [""]
+    for sentence in sentences:
+        if len(text_splits[-1]) + len(str(sentence)) <= text_split_length:
+            # if the last sentence + the current sentence is less than the text_split_length
+            # then add the current sentence to the last sentence
+            text_splits[-1] += " " + str(sentence)
+            text_splits[-1] = text_splits[-1].lstrip()
+        elif len(str(sentence)) > text_split_length:
+            # if the current sentence is greater than the text_split_length
+            for line in textwrap.wrap(
+                str(sentence),
+                width=text_split_length,
+                drop_whitespace=True,
+                break_on_hyphens=False,
+                tabsize=1,
+            ):
+                text_splits.append(str(line))
+        else:
+            text_splits.append(str(sentence))
+
+    if len(text_splits) > 1:
+        if text_splits[0] == "":
+            del text_splits[0]
+    return text_splits
+
+
+def _pack_by_tokens(pieces, max_tokens):
+    # pieces: (text, tokens without the language token); a chunk costs the
+    # language token, its pieces and a [SPACE] between each two of them
+    chunks = []
+    current, current_tokens = [], 1
+    for text, tokens in pieces:
+        if current and current_tokens + 1 + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 1
+        current_tokens += tokens + (1 if current else 0)
+        current.append(text)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
 
 
 def split_sentence(text, lang, text_split_length=250):
     """Preprocess the input text"""
-    text_splits = []
-    if text_split_length is not None and len(text) >= text_split_length:
-        text_splits.append("")
-        nlp = get_spacy_lang(lang)
-        nlp.add_pipe("sentencizer")
-        doc = nlp(text)
-        for sentence in doc.sents:
-            if len(text_splits[-1]) + len(str(sentence)) <= text_split_length:
-                # if the last sentence + the current sentence is less than the text_split_length
-                # then add the current sentence to the last sentence
-                text_splits[-1] += " " + str(sentence)
-                text_splits[-1] = text_splits[-1].lstrip()
-            elif len(str(sentence)) > text_split_length:
-                # if the current sentence is greater than the text_split_length
-                for line in textwrap.wrap(
-                    str(sentence),
-                    width=text_split_length,
-                    drop_whitespace=True,
-                    break_on_hyphens=False,
-                    tabsize=1,
-                ):
-                    text_splits.append(str(line))
-            else:
-                text_splits.append(str(sentence))
+    return split_sentences([text], lang, text_split_length)[0]
 
-        if len(text_splits) > 1:
-            if text_splits[0] == "":
-                del text_splits[0]
-    else:
-        text_splits = [text.lstrip()]
 
-    return text_splits
+def split_sentences(texts, lang, text_split_length=250):
+    """`split_sentence` for many texts, the long ones go through `nlp.pipe` together."""
+    results = [None] * len(texts)
+    long_texts = []
+    for i, text in enumerate(texts):
+        if text_split_length is not None and len(text) >= text_split_length:
+            long_texts.append(i)
+        else:
+            results[i] = [text.lstrip()]
+
+    if long_texts:
+        for i, sentences in zip(long_texts, sentencize([texts[i] for i in long_texts], lang)):
+            results[i] = _pack_sentences(sentences, text_split_length)
+    return results
 
 
 _whitespace_re = re.compile(r"\s+")
@@ -489,6 +557,68 @@ _dot_number_re = re.compile(r"\b\d{1,3}(.\d{3})*(\,\d+)?\b")
 _decimal_number_re = re.compile(r"([0-9]+[.,][0-9]+)")
 
 
+# Bounded memo of num2words results, keyed by (value, lang, mode, currency)
+NUM2WORDS_CACHE_SIZE = int(os.getenv("NUM2WORDS_CACHE_SIZE", "8192"))
+
+# Precomputed words for small non-negative integers, (lang, mode) -> list indexed by value
+_number_tables = {}
+_number_table_hits = 0
+
+
+@lru_cache(maxsize=NUM2WORDS_CACHE_SIZE, typed=True)
+def _num2words_cached(value, lang, mode, currency):
+    # typed=True keeps 5 and 5.0 apart, num2words spells them differently
+    if mode == "currency":
+        return num2words(value, to="currency", currency=currency, lang=lang)
+    if mode == "ordinal":
+        return num2words(value, ordinal=True, lang=lang)
+    return num2words(value, lang=lang)
+
+
+def number_words(value, lang, mode="cardinal", currency=None):
+    """Memoized num2words, `mode` is "cardinal", "ordinal" or "currency"."""
+    global _number_table_hits
+    if type(value) is int and value >= 0:
+        table = _number_tables.get((lang, mode))
+        if table is not None and value < len(table):
+            _number_table_hits += 1
+            return table[value]
+    return _num2words_cached(value, lang, mode, currency)
+
+
+def warm_number_cache(langs, max_value=2100, modes=("cardinal", "ordinal")):
+    """Precompute words for 0..max_value (counts, years) in each language.
+
+    Languages num2words doesn't support are skipped.
+    """
+    for lang in langs:
+        lang = lang if lang != "cs" else "cz"
+        for mode in modes:
+            if (lang, mode) in _number_tables and len(_number_tables[lang, mode]) > max_value:
+                continue
+            try:
+                if mode == "ordinal":
+                    table = [num2words(value, ordinal=True, lang=lang) for value in range(max_value + 1)]
+                else:
+                    table = [num2words(value, lang=lang) for value in range(max_value + 1)]
+            except NotImplementedError:
+                continue
+            # Published in one assignment, readers never see a partial table
+            _number_tables[lang, mode] = table
+
+
+def number_cache_stats():
+    info = _num2words_cached.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "entries": info.currsize,
+        "max_entries": info.maxsize,
+        "table_hits": _number_table_hits,
+        "tables": {f"{lang}:{mode}": len(table) for (lang, mode), table in _number_tables.items()},
+    }
+
+
 def _remove_commas(m):
     text = m.group(0)
     if "," in text:
@@ -505,12 +635,12 @@ def _remove_dots(m):
 
 def _expand_decimal_point(m, lang="en"):
     amount = m.group(1).replace(",", ".")
-    return num2words(float(amount), lang=lang if lang != "cs" else "cz")
+    return number_words(float(amount), lang if lang != "cs" else "cz")
 
 
 def _expand_currency(m, lang="en", currency="USD"):
     amount = float((re.sub(r"[^\d.]", "", m.group(0).replace(",", "."))))
-    full_amount = num2words(amount, to="currency", currency=currency, lang=lang if lang != "cs" else "cz")
+    full_amount = number_words(amount, lang if lang != "cs" else "cz", mode="currency", currency=currency)
 
     and_equivalents = {
         "en": ", ",
@@ -538,11 +668,11 @@ def _expand_currency(m, lang="en", currency="USD"):
 
 
 def _expand_ordinal(m, lang="en"):
-    return num2words(int(m.group(1)), ordinal=True, lang=lang if lang != "cs" else "cz")
+    return number_words(int(m.group(1)), lang if lang != "cs" else "cz", mode="ordinal")
 
 
 def _expand_number(m, lang="en"):
-    return num2words(int(m.group(0)), lang=lang if lang != "cs" else "cz")
+    return number_words(int(m.group(0)), lang if lang != "cs" else "cz")
 
 
 def expand_numbers_multilingual(text, lang="en"):
@@ -575,6 +705,11 @@ def collapse_whitespace(text):
 
 
 def multilingual_cleaners(text, lang):
+    return get_normalizer(lang)(text)
+
+
+def _multilingual_cleaners_sequential(text, lang):
+    # Reference implementation, one regex pass per table entry
     text = text.replace('"', "")
     if lang == "tr":
         text = text.replace("İ", "i")
@@ -588,6 +723,141 @@ def multilingual_cleaners(text, lang):
     return text
 
 
+class _CombinedTable:
+    """A list of (regex, replacement) pairs merged into one regex.
+
+    Every entry becomes one capturing group and `m.lastindex` tells which entry
+    matched; tables of single symbols become a character class looked up by
+    the matched character. `pattern` stays None when one scan could give a different result
+    than applying the entries one after the other (mixed flags, a replacement
+    that a later entry would match again, entries overlapping each other), the
+    caller then uses the sequential path.
+    """
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.pattern = None
+        self.replacements = {}
+        self.dispatch_on_text = False
+        # \b looks one character outside the match, so a replacement can change
+        # whether a directly following match still applies
+        self.check_adjacent = any("\\b" in regex.pattern or "(?" in regex.pattern for regex, _ in pairs)
+        flags = {regex.flags for regex, _ in pairs}
+        if len(flags) != 1 or not self._single_pass_safe():
+            return
+
+        flags = flags.pop()
+        samples = [self._literal_sample(regex) for regex, _ in pairs]
+        if not self.check_adjacent and all(
+            sample is not None and len(sample) == 1 and sample.lower() == sample.upper() for sample in samples
+        ):
+            # Caseless single characters: one character class, dispatch on the matched text
+            self.pattern = re.compile("[%s]" % "".join(re.escape(sample) for sample in samples), flags)
+            for sample, (_, replacement) in zip(samples, pairs):
+                self.replacements.setdefault(sample, replacement)
+            self.dispatch_on_text = True
+            return
+
+        # A shared leading \b is checked once instead of once per alternative
+        prefix = "\\b" if all(regex.pattern.startswith("\\b") for regex, _ in pairs) else ""
+        parts = []
+        group = 1
+        for regex, replacement in pairs:
+            parts.append("(%s)" % regex.pattern[len(prefix):])
+            self.replacements[group] = replacement
+            group += regex.groups + 1
+        self.pattern = re.compile("%s(?:%s)" % (prefix, "|".join(parts)), flags)
+
+    @staticmethod
+    def _literal_sample(regex):
+        # What a pattern made of literal characters (and \b) matches, None otherwise
+        literal = regex.pattern.replace("\\b", "")
+        if re.search(r"(?<!\\)[][(){}|?*+^$.]", literal):
+            return None
+        return re.sub(r"\\(.)", r"\1", literal)
+
+    def _single_pass_safe(self):
+        regexes = [regex for regex, _ in self.pairs]
+        for regex, replacement in self.pairs:
+            if "\\" in replacement:
+                return False
+            for context in (" %s " % replacement, " %s." % replacement):
+                if any(other.search(context) for other in regexes):
+                    return False
+
+            sample = self._literal_sample(regex)
+            if sample is None:
+                return False
+            context = " %s " % sample
+            for other in regexes:
+                if other is regex:
+                    continue
+                for m in other.finditer(context):
+                    if (m.start(), m.end()) != (1, len(sample) + 1) and m.start() < len(sample) + 1 and m.end() > 1:
+                        return False
+        return True
+
+    def sub(self, text, sequential):
+        if not self.pairs:
+            return text
+        if self.pattern is None:
+            return sequential(text)
+        if self.dispatch_on_text:
+            return self.pattern.sub(lambda m: self.replacements[m.group()], text)
+
+        out = []
+        pos = 0
+        for m in self.pattern.finditer(text):
+            if self.check_adjacent and out and m.start() == pos:
+                return sequential(text)
+            out.append(text[pos:m.start()])
+            out.append(self.replacements[m.lastindex])
+            pos = m.end()
+        if not out:
+            return text
+        out.append(text[pos:])
+        return "".join(out)
+
+
+class MultilingualNormalizer:
+    """`multilingual_cleaners` for one language with its tables precompiled.
+
+    The abbreviation and symbol tables are each scanned once per text instead
+    of once per entry. Texts with abbreviation matches directly next to each
+    other fall back to the sequential substitutions, where one replacement can
+    disable the next match.
+    """
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.translation = {ord('"'): None}
+        if lang == "tr":
+            self.translation.update({ord("İ"): "i", ord("Ö"): "ö", ord("Ü"): "ü"})
+        self.abbreviations = _CombinedTable(_abbreviations[lang])
+        self.symbols = _CombinedTable(_symbols_multilingual[lang])
+
+    def __call__(self, text):
+        text = text.translate(self.translation)
+        text = lowercase(text)
+        text = expand_numbers_multilingual(text, self.lang)
+        text = self.abbreviations.sub(text, lambda t: expand_abbreviations_multilingual(t, self.lang))
+        # Double spaces left by the symbol replacements go away in collapse_whitespace
+        text = self.symbols.sub(text, lambda t: expand_symbols_multilingual(t, lang=self.lang)).strip()
+        text = collapse_whitespace(text)
+        return text
+
+
+_normalizers = {}
+
+
+def get_normalizer(lang):
+    normalizer = _normalizers.get(lang)
+    if normalizer is None:
+        # Building twice under a race is harmless, keep the first one
+        normalizer = _normalizers.setdefault(lang, MultilingualNormalizer(lang))
+    return normalizer
+
+
 def basic_cleaners(text):
     """Basic pipeline that lowercases and collapses whitespace without transliteration."""
     text = lowercase(text)
@@ -595,12 +865,52 @@ def basic_cleaners(text):
     return text
 
 
-def chinese_transliterate(text):
+TRANSLIT_CACHE_SIZE = int(os.getenv("TRANSLIT_CACHE_SIZE", "16384"))
+
+# pypinyin only segments phrases inside runs of Han characters, so text can be
+# cut at whitespace and punctuation without changing the result
+_zh_clause_re = re.compile(r"([\s,.!?;:，。！？、；：]+)")
+# Academic romanization only looks at the previous syllable, and a whitespace
+# character is never one
+_ko_word_re = re.compile(r"(\s+)")
+
+_pinyin = None
+_korean_transliter = None
+
+
+def _get_pinyin():
+    global _pinyin
+    if _pinyin is None:
+        # Same converter pypinyin.pinyin() builds on every call
+        from pypinyin.converter import UltimateConverter
+
+        _pinyin = pypinyin.core.Pinyin(UltimateConverter(neutral_tone_with_five=True))
+    return _pinyin
+
+
+def _get_korean_transliter():
+    global _korean_transliter
+    if _korean_transliter is None:
+        _korean_transliter = Transliter(academic)
+    return _korean_transliter
+
+
+@lru_cache(maxsize=TRANSLIT_CACHE_SIZE)
+def _chinese_clause(clause):
     return "".join(
-        [p[0] for p in pypinyin.pinyin(text, style=pypinyin.Style.TONE3, heteronym=False, neutral_tone_with_five=True)]
+        [p[0] for p in _get_pinyin().pinyin(clause, style=pypinyin.Style.TONE3, heteronym=False)]
     )
 
 
+@lru_cache(maxsize=TRANSLIT_CACHE_SIZE)
+def _korean_word(word):
+    return _get_korean_transliter().translit(word)
+
+
+def chinese_transliterate(text):
+    return "".join(_chinese_clause(part) if i % 2 == 0 else part for i, part in enumerate(_zh_clause_re.split(text)))
+
+
 def japanese_cleaners(text, katsu):
     text = katsu.romaji(text)
     text = lowercase(text)
@@ -608,10 +918,26 @@ def japanese_cleaners(text, katsu):
 
 
 def korean_transliterate(text):
-    r = Transliter(academic)
-    return r.translit(text)
+    return "".join(_korean_word(part) if i % 2 == 0 else part for i, part in enumerate(_ko_word_re.split(text)))
+
+
+def transliterate_batch(texts, lang):
+    """chinese/korean_transliterate over many texts, repeated texts are converted once."""
+    transliterate = {"zh": chinese_transliterate, "ko": korean_transliterate}[lang]
+    unique = {text: None for text in texts}
+    for text in unique:
+        unique[text] = transliterate(text)
+    return [unique[text] for text in texts]
 
 
+def transliteration_cache_stats():
+    return {"zh": _chinese_clause.cache_info()._asdict(), "ko": _korean_word.cache_info()._asdict()}
+
+
+# Text tokens per generated chunk: about the longest chunk the 250 character
+# English limit produces, XTTS stops generating audio after ~27 s
+TEXT_SPLIT_MAX_TOKENS = int(os.getenv("TEXT_SPLIT_MAX_TOKENS", "130"))
+
 DEFAULT_VOCAB_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../data/tokenizer.json")
 
 
@@ -637,6 +963,7 @@ class VoiceBpeTokenizer:
             "ja": 71,
             "hu": 224,
             "ko": 95,
+            "hi": 150,
         }
 
     @cached_property
@@ -669,14 +996,110 @@ class VoiceBpeTokenizer:
             raise NotImplementedError(f"Language '{lang}' is not supported.")
         return txt
 
-    def encode(self, txt, lang):
-        lang = lang.split("-")[0]  # remove the region
-        self.check_input_length(txt, lang)
+    def _bpe_input(self, txt, lang):
         txt = self.preprocess_text(txt, lang)
         lang = "zh-cn" if lang == "zh" else lang
         txt = f"[{lang}]{txt}"
-        txt = txt.replace(" ", "[SPACE]")
-        return self.tokenizer.encode(txt).ids
+        return txt.replace(" ", "[SPACE]")
+
+    def encode(self, txt, lang):
+        lang = lang.split("-")[0]  # remove the region
+        self.check_input_length(txt, lang)
+        return self.tokenizer.encode(self._bpe_input(txt, lang)).ids
+
+    def encode_batch(self, texts, lang, padding=False, num_workers=1):
+        """`encode` for many texts of one language.
+
+        Each distinct text is preprocessed once, in `num_workers` processes
+        when > 1 (the cleaners are pure Python, threads would not help; the
+        workers take a few seconds to start, so this pays off for dataset
+        sized batches), and the BPE step runs in the Rust
+        `Tokenizer.encode_batch`, which is parallel. Returns a list of id
+        lists, or with `padding=True` a zero-padded IntTensor [B, T] and an
+        IntTensor [B] of lengths, like the XTTS dataset collate.
+        """
+        lang = lang.split("-")[0]  # remove the region
+        unique = list(dict.fromkeys(texts))
+        for txt in unique:
+            self.check_input_length(txt, lang)
+        encoded = self._encode_unique(unique, lang, num_workers)
+        ids = [encoded[txt] for txt in texts]
+        if not padding:
+            return ids
+
+        lengths = torch.IntTensor([len(seq) for seq in ids])
+        padded = torch.zeros(len(ids), int(lengths.max()) if ids else 0, dtype=torch.int32)
+        for i, seq in enumerate(ids):
+            padded[i, : len(seq)] = torch.IntTensor(seq)
+        return padded, lengths
+
+    def _encode_unique(self, unique, lang, num_workers=1):
+        if num_workers > 1 and len(unique) > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: forking a process that holds CUDA or tokenizers threads is unsafe
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                chunksize = max(1, len(unique) // (num_workers * 4))
+                bpe_inputs = list(pool.map(_bpe_input_worker, unique, [lang] * len(unique), chunksize=chunksize))
+        else:
+            bpe_inputs = [self._bpe_input(txt, lang) for txt in unique]
+        return dict(zip(unique, (e.ids for e in self.tokenizer.encode_batch(bpe_inputs))))
+
+    def count_tokens(self, texts, lang):
+        """Encoded lengths of `texts`, including the language token, without the length warnings."""
+        lang = lang.split("-")[0]  # remove the region
+        encoded = self._encode_unique(list(dict.fromkeys(texts)), lang)
+        return [len(encoded[txt]) for txt in texts]
+
+    def split_by_tokens(self, texts, lang, max_tokens=None):
+        """Token-aware `split_sentences`: chunks of at most `max_tokens` BPE tokens
+        (TEXT_SPLIT_MAX_TOKENS by default).
+
+        Texts that fit are kept whole. Longer ones are cut into sentences,
+        which are packed greedily so each chunk holds as many as fit. A chunk's
+        length is computed from its sentences' lengths: pieces joined by a
+        space encode to their own tokens plus one [SPACE] and a single
+        language token, since BPE merges never cross [SPACE]. Sentences over
+        the budget are wrapped at a width estimated from their token density.
+        """
+        lang = lang.split("-")[0]  # remove the region
+        max_tokens = max_tokens or TEXT_SPLIT_MAX_TOKENS
+        results = [None] * len(texts)
+        long_texts = []
+        for i, (text, count) in enumerate(zip(texts, self.count_tokens(texts, lang))):
+            if count <= max_tokens:
+                results[i] = [text.strip()]
+            else:
+                long_texts.append(i)
+        if not long_texts:
+            return results
+
+        sentences = {}
+        for i, doc_sentences in zip(long_texts, sentencize([texts[i] for i in long_texts], lang)):
+            sentences[i] = [sent.strip() for sent in doc_sentences if sent.strip()]
+        flat = [sent for i in long_texts for sent in sentences[i]]
+        # Without the language token, which a chunk only has once
+        costs = dict(zip(flat, (count - 1 for count in self.count_tokens(flat, lang))))
+
+        for i in long_texts:
+            pieces = []
+            for sent in sentences[i]:
+                if costs[sent] + 1 > max_tokens:
+                    pieces.extend(self._wrap_by_tokens(sent, costs[sent], lang, max_tokens))
+                else:
+                    pieces.append((sent, costs[sent]))
+            results[i] = _pack_by_tokens(pieces, max_tokens) or [texts[i].strip()]
+        return results
+
+    def _wrap_by_tokens(self, sentence, cost, lang, max_tokens):
+        width = max(1, len(sentence) * (max_tokens - 1) // cost)
+        while True:
+            lines = textwrap.wrap(sentence, width=width, drop_whitespace=True, break_on_hyphens=False, tabsize=1)
+            counts = self.count_tokens(lines, lang)
+            if width == 1 or max(counts) <= max_tokens:
+                return [(line, count - 1) for line, count in zip(lines, counts)]
+            width = max(1, width * 9 // 10)
 
     def decode(self, seq):
         if isinstance(seq, torch.Tensor):
@@ -694,6 +1117,17 @@ class VoiceBpeTokenizer:
         return max(self.tokenizer.get_vocab().values()) + 1
 
 
+_worker_tokenizer = None
+
+
+def _bpe_input_worker(txt, lang):
+    # Runs in encode_batch worker processes, only the cleaners are needed there
+    global _worker_tokenizer
+    if _worker_tokenizer is None:
+        _worker_tokenizer = VoiceBpeTokenizer()
+    return _worker_tokenizer._bpe_input(txt, lang)
+
+
 def test_expand_numbers_multilingual():
     test_cases = [
         # English
@@ -863,7 +1297,36 @@ def test_symbols_multilingual():
         assert out == b, f"'{out}' vs '{b}'"
 
 
+def _normalizer_corpus(lang, size=300, seed=0):
+    rng = random.Random(seed)
+    pieces = ['"quoted"', "hello", "world", "İstanbul", "Öz", "12", "3.5", "1,000", "$20", "10€", "2nd", "  ", "\n", "."]
+    for regex, _ in _abbreviations[lang] + _symbols_multilingual[lang]:
+        sample = re.sub(r"\\(.)", r"\1", regex.pattern.replace("\\b", ""))
+        pieces += [sample, sample.upper(), sample.capitalize()]
+    texts = []
+    for _ in range(size):
+        words = [rng.choice(pieces) for _ in range(rng.randint(1, 12))]
+        # Mix separated and directly adjacent pieces
+        texts.append("".join(word + rng.choice(["", " ", " ", ", "]) for word in words))
+    return texts
+
+
+def test_multilingual_cleaners_parity():
+    for lang in sorted(_abbreviations):
+        for text in _normalizer_corpus(lang):
+            # Some num2words versions lack a language, both paths must fail the same way then
+            results = []
+            for cleaner in (multilingual_cleaners, _multilingual_cleaners_sequential):
+                try:
+                    results.append(cleaner(text, lang))
+                except NotImplementedError as e:
+                    results.append(type(e))
+            out, expected = results
+            assert out == expected, f"{lang}: '{out}' vs '{expected}' for '{text}'"
+
+
 if __name__ == "__main__":
     test_expand_numbers_multilingual()
     test_abbreviations_multilingual()
     test_symbols_multilingual()
+    test_multilingual_cleaners_parity()
@@ -16,11 +16,13 @@ import torchaudio
 import traceback
 from utils.formatter import format_audio_list,find_latest_best_model, list_audios
 from utils.gpt_train import train_gpt
-
-from faster_whisper import WhisperModel
+from utils.asr_pool import get_whisper_model, ASR_NUM_WORKERS, ASR_BATCH_SIZE
+from utils.latent_cache import latent_cache, model_id_for_checkpoint
+from utils.audio_cache import is_deterministic, synthesis_cache
+from utils.mapped_xtts import MappedXtts
+from utils.model_export import OPTIMIZED_MODEL_FILES, export_ready_model
 
 from TTS.tts.configs.xtts_config import XttsConfig
-from TTS.tts.models.xtts import Xtts
 
 import requests
 
@@ -52,6 +54,10 @@ def clear_gpu_cache():
         torch.cuda.empty_cache()
 
 XTTS_MODEL = None
+XTTS_CHECKPOINT = None
+# Id of the loaded checkpoint, taken at load time: the file may be optimized away while the model is in use
+XTTS_MODEL_ID = None
+LAST_TTS_OUTPUT = None
 
 def create_zip(folder_path, zip_name):
     zip_path = os.path.join(tempfile.gettempdir(), f"{zip_name}.zip")
@@ -71,17 +77,19 @@ def get_dataset_zip(out_path):
     return None
 
 def load_model(xtts_checkpoint, xtts_config, xtts_vocab,xtts_speaker):
-    global XTTS_MODEL
+    global XTTS_MODEL, XTTS_CHECKPOINT, XTTS_MODEL_ID
     clear_gpu_cache()
     if not xtts_checkpoint or not xtts_config or not xtts_vocab:
         return "You need to run the previous steps or manually set the `XTTS checkpoint path`, `XTTS config path`, and `XTTS vocab path` fields !!"
     config = XttsConfig()
     config.load_json(xtts_config)
-    XTTS_MODEL = Xtts.init_from_config(config)
+    XTTS_MODEL = MappedXtts(config)
     print("Loading XTTS model! ")
     XTTS_MODEL.load_checkpoint(config, checkpoint_path=xtts_checkpoint, vocab_path=xtts_vocab,speaker_file_path=xtts_speaker, use_deepspeed=False)
     if torch.cuda.is_available():
         XTTS_MODEL.cuda()
+    XTTS_CHECKPOINT = str(xtts_checkpoint)
+    XTTS_MODEL_ID = model_id_for_checkpoint(XTTS_CHECKPOINT)
 
     print("Model Loaded!")
     return "Model Loaded!"
@@ -90,39 +98,62 @@ def run_tts(lang, tts_text, speaker_audio_file, temperature, length_penalty,repe
     if XTTS_MODEL is None or not speaker_audio_file:
         return "You need to run the previous step to load the model !!", None, None
 
-    gpt_cond_latent, speaker_embedding = XTTS_MODEL.get_conditioning_latents(audio_path=speaker_audio_file, gpt_cond_len=XTTS_MODEL.config.gpt_cond_len, max_ref_length=XTTS_MODEL.config.max_ref_len, sound_norm_refs=XTTS_MODEL.config.sound_norm_refs)
-    
+    # Latents only depend on the model and the reference, reuse them across generations
+    model_id = XTTS_MODEL_ID
+    gpt_cond_latent, speaker_embedding = latent_cache.get_or_compute(
+        XTTS_MODEL,
+        model_id,
+        str(speaker_audio_file),
+        cache_dir=os.path.join(os.path.dirname(XTTS_CHECKPOINT), "latents"),
+    )
+
     if use_config:
-        out = XTTS_MODEL.inference(
-            text=tts_text,
-            language=lang,
-            gpt_cond_latent=gpt_cond_latent,
-            speaker_embedding=speaker_embedding,
+        params = dict(
             temperature=XTTS_MODEL.config.temperature, # Add custom parameters here
             length_penalty=XTTS_MODEL.config.length_penalty,
             repetition_penalty=XTTS_MODEL.config.repetition_penalty,
             top_k=XTTS_MODEL.config.top_k,
             top_p=XTTS_MODEL.config.top_p,
-            enable_text_splitting = True
+            enable_text_splitting=True,
         )
     else:
-        out = XTTS_MODEL.inference(
-            text=tts_text,
-            language=lang,
-            gpt_cond_latent=gpt_cond_latent,
-            speaker_embedding=speaker_embedding,
+        params = dict(
             temperature=temperature, # Add custom parameters here
             length_penalty=length_penalty,
             repetition_penalty=float(repetition_penalty),
             top_k=top_k,
             top_p=top_p,
-            enable_text_splitting = sentence_split
+            enable_text_splitting=sentence_split,
+        )
+
+    wav = None
+    cache_key = None
+    if is_deterministic(params["top_k"]):
+        latent_key = latent_cache.key_for_model(XTTS_MODEL, model_id, str(speaker_audio_file))
+        cache_key = synthesis_cache.key(model_id, latent_key, tts_text, lang, params)
+        wav = synthesis_cache.get(cache_key)
+
+    if wav is None:
+        out = XTTS_MODEL.inference(
+            text=tts_text,
+            language=lang,
+            gpt_cond_latent=gpt_cond_latent,
+            speaker_embedding=speaker_embedding,
+            **params,
         )
+        wav = out["wav"]
+        if cache_key is not None:
+            synthesis_cache.put(cache_key, wav)
+
+    # Only the latest generation is shown, remove the previous temp file
+    global LAST_TTS_OUTPUT
+    if LAST_TTS_OUTPUT and os.path.exists(LAST_TTS_OUTPUT):
+        os.remove(LAST_TTS_OUTPUT)
 
     with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as fp:
-        out["wav"] = torch.tensor(out["wav"]).unsqueeze(0)
         out_path = fp.name
-        torchaudio.save(out_path, out["wav"], 24000)
+        torchaudio.save(out_path, torch.tensor(wav).unsqueeze(0), 24000)
+    LAST_TTS_OUTPUT = out_path
 
     return "Speech generated !", out_path, speaker_audio_file
 
@@ -143,9 +174,9 @@ def load_params_tts(out_path,version):
     speaker_path =  ready_model_path / "speakers_xtts.pth"
     reference_path  = ready_model_path / "reference.wav"
 
-    model_path = ready_model_path / "model.pth"
+    model_path = next((ready_model_path / name for name in OPTIMIZED_MODEL_FILES.values() if (ready_model_path / name).exists()), None)
 
-    if not model_path.exists():
+    if model_path is None:
         model_path = ready_model_path / "unoptimize_model.pth"
         if not model_path.exists():
           return "Params for TTS not found", "", "", ""         
@@ -301,17 +332,9 @@ if __name__ == "__main__":
                     return "No audio files found! Please provide files via Gradio or specify a folder path.", "", ""
                 else:
                     try:
-                        # Loading Whisper
-                        device = "cuda" if torch.cuda.is_available() else "cpu" 
-                        
-                        # Detect compute type 
-                        if torch.cuda.is_available():
-                            compute_type = "float16"
-                        else:
-                            compute_type = "float32"
-                        
-                        asr_model = WhisperModel(whisper_model, device=device, compute_type=compute_type)
-                        train_meta, eval_meta, audio_total_size = format_audio_list(audio_files, asr_model=asr_model, target_language=language, out_path=out_path, gradio_progress=progress)
+                        # Whisper models are cached across runs
+                        asr_model = get_whisper_model(whisper_model)
+                        train_meta, eval_meta, audio_total_size = format_audio_list(audio_files, asr_model=asr_model, target_language=language, out_path=out_path, gradio_progress=progress, num_workers=ASR_NUM_WORKERS, batch_size=ASR_BATCH_SIZE)
                     except:
                         traceback.print_exc()
                         error = traceback.format_exc()
@@ -380,6 +403,10 @@ if __name__ == "__main__":
                 step=1,
                 value=args.max_audio_length,
             )
+            resume_training = gr.Checkbox(
+                label="Resume the last run from its latest checkpoint",
+                value=False,
+            )
 
             # new updated line ...
             console_output = gr.Textbox(label="Console Output", lines=10, interactive=False)
@@ -395,6 +422,21 @@ if __name__ == "__main__":
                     "dataset",
                     "all"
                 ])
+            optimize_dtype = gr.Dropdown(
+                label="Weights precision of the optimized model",
+                value="fp32",
+                choices=[
+                    "fp32",
+                    "fp16",
+                    "bf16"
+                ])
+            optimize_format = gr.Dropdown(
+                label="File format of the optimized model (safetensors loads memory-mapped)",
+                value="pth",
+                choices=[
+                    "pth",
+                    "safetensors"
+                ])
             
             progress_train = gr.Label(
                 label="Progress:"
@@ -412,7 +454,7 @@ if __name__ == "__main__":
             import sys
 
             
-            def train_model(custom_model, version, language, train_csv, eval_csv, num_epochs, batch_size, grad_acumm, output_path, max_audio_length):
+            def train_model(custom_model, version, language, train_csv, eval_csv, num_epochs, batch_size, grad_acumm, output_path, max_audio_length, resume_training=False):
                 clear_gpu_cache()
           
                 # Check if `custom_model` is a URL and download it if true.
@@ -424,8 +466,8 @@ if __name__ == "__main__":
             
                 run_dir = Path(output_path) / "run"
             
-                # Remove train dir
-                if run_dir.exists():
+                # Remove train dir, unless the run in it is resumed
+                if run_dir.exists() and not resume_training:
                     shutil.rmtree(run_dir)
                 
                 # Check if the dataset language matches the language you specified 
@@ -445,7 +487,7 @@ if __name__ == "__main__":
                 try:
                     # convert seconds to waveform frames
                     max_audio_length = int(max_audio_length * 22050)
-                    speaker_xtts_path, config_path, original_xtts_checkpoint, vocab_file, exp_path, speaker_wav = train_gpt(custom_model, version, language, num_epochs, batch_size, grad_acumm, train_csv, eval_csv, output_path=output_path, max_audio_length=max_audio_length)
+                    speaker_xtts_path, config_path, original_xtts_checkpoint, vocab_file, exp_path, speaker_wav = train_gpt(custom_model, version, language, num_epochs, batch_size, grad_acumm, train_csv, eval_csv, output_path=output_path, max_audio_length=max_audio_length, resume=resume_training)
                 except:
                     traceback.print_exc()
                     error = traceback.format_exc()
@@ -467,7 +509,7 @@ if __name__ == "__main__":
                 print("Model training done!")
                 return "Model training done!", config_path, vocab_file, ft_xtts_checkpoint, speaker_xtts_path, speaker_reference_new_path
 
-            def optimize_model(out_path, clear_train_data):
+            def optimize_model(out_path, clear_train_data, optimize_dtype, optimize_format):
                 # print(out_path)
                 out_path = Path(out_path)  # Ensure that out_path is a Path object.
             
@@ -494,23 +536,10 @@ if __name__ == "__main__":
                 if not model_path.is_file():
                     return "Unoptimized model not found in ready folder", ""
             
-                # Load the checkpoint and remove unnecessary parts.
-                checkpoint = torch.load(model_path, map_location=torch.device("cpu"))
-                del checkpoint["optimizer"]
-
-                for key in list(checkpoint["model"].keys()):
-                    if "dvae" in key:
-                        del checkpoint["model"][key]
-
-                # Make sure out_path is a Path object or convert it to Path
-                os.remove(model_path)
-
-                  # Save the optimized model.
-                optimized_model_file_name="model.pth"
-                optimized_model=ready_dir/optimized_model_file_name
-            
-                torch.save(checkpoint, optimized_model)
-                ft_xtts_checkpoint=str(optimized_model)
+                # Copy only the inference weights (no optimizer state, no dvae) without loading the whole checkpoint
+                ft_xtts_checkpoint = export_ready_model(
+                    ready_dir, dtype=None if optimize_dtype == "fp32" else optimize_dtype, fmt=optimize_format
+                )
 
                 clear_gpu_cache()
         
@@ -789,6 +818,7 @@ And sometimes, a second chance is all you need.""",
                     grad_acumm,
                     out_path,
                     max_audio_length,
+                    resume_training,
                 ],
                 outputs=[
                     progress_train,
@@ -808,7 +838,9 @@ And sometimes, a second chance is all you need.""",
                 fn=optimize_model,
                 inputs=[
                     out_path,
-                    clear_train_data
+                    clear_train_data,
+                    optimize_dtype,
+                    optimize_format
                 ],
                 outputs=[progress_train,xtts_checkpoint],
             )
@@ -22,6 +22,7 @@ export function ModelTrainingTab() {
   const [epochs, setEpochs] = useState("10")
   const [isTraining, setIsTraining] = useState(false)
   const [logs, setLogs] = useState<string[]>([])
+  const [jobId, setJobId] = useState<string | null>(null)
   const scrollAreaRef = useRef<HTMLDivElement>(null)
   const wsRef = useRef<WebSocket | null>(null)
   const { toast } = useToast()
@@ -68,13 +69,30 @@ export function ModelTrainingTab() {
   // }, [isTraining, selectedDataset])
 
   useEffect(() => {
-    if (isTraining) {
-      const ws = new WebSocket("ws://localhost:8000/ws/train-logs")
+    if (isTraining && jobId) {
+      const token = localStorage.getItem("token")
+      const ws = new WebSocket(`ws://localhost:8000/ws/train-logs?token=${token}&job_id=${jobId}`)
       wsRef.current = ws
 
       ws.onmessage = (event) => {
-        const timestamp = new Date().toLocaleTimeString()
-        setLogs((prev) => [...prev, `[${timestamp}] ${event.data}`])
+        const message = JSON.parse(event.data)
+        const timestamp = new Date((message.time ?? Date.now() / 1000) * 1000).toLocaleTimeString()
+        let line: string | null = null
+        if (message.type === "log") {
+          line = message.line
+        } else if (message.type === "metrics") {
+          const loss = message.train?.loss
+          line = `Epoch ${message.epoch + 1}/${message.epochs} - Step ${message.step}/${message.total_steps}` +
+            (loss !== undefined ? ` - Loss: ${loss.toFixed(4)}` : "")
+        } else if (message.type === "dropped") {
+          line = `... ${message.count} earlier lines skipped`
+        } else if (message.type === "end" || message.type === "error") {
+          line = message.type === "end" ? `Training ${message.status}${message.error ? `: ${message.error}` : ""}` : message.detail
+          setIsTraining(false)
+        }
+        if (line !== null) {
+          setLogs((prev) => [...prev, `[${timestamp}] ${line}`])
+        }
       }
 
       ws.onerror = () => {
@@ -91,7 +109,7 @@ export function ModelTrainingTab() {
 
       return () => ws.close()
     }
-  }, [isTraining])
+  }, [isTraining, jobId])
 
 
   // Auto-scroll to bottom of logs
@@ -116,19 +134,22 @@ const handleStartTraining = async () => {
 
     setIsTraining(true)
     setLogs([])
+    setJobId(null)
 
     try {
       const res = await fetch("http://localhost:8000/api/train/start", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Authorization: `Bearer ${localStorage.getItem("token")}`,
         },
-        body: JSON.stringify({ dataset: selectedDataset, epochs: Number(epochs) }),
+        body: JSON.stringify({ name: selectedDataset, epochs: Number(epochs) }),
       })
       const data = await res.json()
       if (!data.success) {
-        throw new Error(data.message || "Failed to start training")
+        throw new Error(data.detail || data.message || "Failed to start training")
       }
+      setJobId(data.job_id)
     } catch (err) {
       toast({
         title: "Error starting training",
@@ -142,6 +163,12 @@ const handleStartTraining = async () => {
 
  
   const handleStopTraining = () => {
+    if (jobId) {
+      fetch(`http://localhost:8000/api/train/jobs/${jobId}`, {
+        method: "DELETE",
+        headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
+      })
+    }
     setIsTraining(false)
     const timestamp = new Date().toLocaleTimeString()
     setLogs((prev) => [...prev, `[${timestamp}] Training stopped by user.`])